@@ -0,0 +1,40 @@
+import unicodedata
+
+from django.db import migrations, models
+
+
+def username_key(username):
+    # authentication.models.username_key when this migration was written
+    decomposed = unicodedata.normalize("NFKD", username.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def fill_username_keys(apps, schema_editor):
+    User = apps.get_model("authentication", "User")
+    users = User.objects.only("id", "username")
+    batch = []
+    for user in users.iterator(chunk_size=2000):
+        user.username_key = username_key(user.username)
+        batch.append(user)
+        if len(batch) == 2000:
+            User.objects.bulk_update(batch, ["username_key"])
+            batch = []
+    User.objects.bulk_update(batch, ["username_key"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0002_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="username_key",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=150
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_username_keys, migrations.RunPython.noop),
+    ]
@@ -1,24 +1,82 @@
+import unicodedata
+from functools import cached_property
+
 from django.contrib.auth.models import AbstractUser
-from django.db.models import Q
+from django.db import models
+from django.db.models import Exists, OuterRef
+
+from reviews.models import Ticket, Review, UserFollows, UserBlocked
 
-from reviews.models import Ticket, Review
+
+def username_key(username):
+    """
+    Normalized form of a username, compared by the autocomplete: case and
+    accents are ignored.
+    """
+    decomposed = unicodedata.normalize("NFKD", username.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
 
 
 class User(AbstractUser):
     first_name = None
     last_name = None
+    # Denormalized counters, maintained by the signals of the reviews app
+    ticket_count = models.PositiveIntegerField(default=0, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    follower_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    # username_key(username), searched by prefix with an index range
+    username_key = models.CharField(max_length=150, db_index=True, editable=False)
 
     REQUIRED_FIELDS = []
 
+    def save(self, *args, **kwargs):
+        self.username_key = username_key(self.username)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "username" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "username_key"}
+        super().save(*args, **kwargs)
+
+    @cached_property
+    def feed_user_ids(self):
+        """
+        Subquery of the ids of the users whose posts are in the feed: the
+        followed users and the user itself. It is resolved by the database
+        inside the feed queries and built once per user instance, hence once
+        per request for request.user.
+        """
+        followed = UserFollows.objects.filter(user_id=self.id).values(
+            "followed_user_id"
+        )
+        return followed.union(User.objects.filter(id=self.id).values("id"), all=True)
+
+    def not_blocked(self, author_ref="user_id"):
+        """
+        Condition excluding the posts whose author (`author_ref`) is blocked
+        by the user or has blocked the user. Both sides are NOT EXISTS
+        anti-joins covered by an index of UserBlocked.
+        """
+        blocked = UserBlocked.objects.filter(
+            user_id=self.id, blocked_user_id=OuterRef(author_ref)
+        )
+        blocking = UserBlocked.objects.filter(
+            user_id=OuterRef(author_ref), blocked_user_id=self.id
+        )
+        return ~Exists(blocked) & ~Exists(blocking)
+
     def get_viewable_tickets(self):
-        users = [user_follow.followed_user for user_follow in self.following.all()]
-        users.append(self)
-        tickets = Ticket.objects.filter(user__in=users)
-        return tickets
+        return Ticket.objects.filter(self.not_blocked(), user_id__in=self.feed_user_ids)
+
+    def get_followed_reviews(self):
+        """Reviews written by the user or by followed users."""
+        return Review.objects.filter(self.not_blocked(), user_id__in=self.feed_user_ids)
+
+    def get_replies(self):
+        """Reviews answering the user's tickets, written by anyone else."""
+        return Review.objects.filter(
+            self.not_blocked(), ticket__user_id=self.id
+        ).exclude(user_id__in=self.feed_user_ids)
 
     def get_viewable_reviews(self):
-        users = [user_follow.followed_user for user_follow in self.following.all()]
-        users.append(self)
-        query = Q(user__in=users) | (Q(ticket__user=self) & ~Q(user__in=users))
-        reviews = Review.objects.filter(query).distinct()
-        return reviews
+        # A review has a single ticket, so the join needs no DISTINCT
+        return self.get_followed_reviews() | self.get_replies()
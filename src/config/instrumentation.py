@@ -0,0 +1,148 @@
+"""
+Measures what a block of code costs: the SQL queries it runs, their time,
+and the time spent rendering templates or serializing JSON.
+
+Used by the ``benchmark`` command and the profiling middleware. Queries are
+captured with database execute wrappers and template renders through a hook
+on Django's template backend, so it works without DEBUG and on every
+database backend.
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.db import connections
+from django.template.backends.django import Template
+
+# Values that vary between two runs of the same query
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+# Active recorders, innermost last: recorders can be nested
+_recorders = ContextVar("instrumentation_recorders", default=())
+_rendering = ContextVar("instrumentation_rendering", default=False)
+_original_render = Template.render
+
+
+@contextmanager
+def timed_render():
+    """
+    Adds the time of the block to the render time of the active recorders:
+    template renders, or the serialization of a JSON response.
+    """
+    recorders = _recorders.get()
+    # Templates rendered by a template (form renderers, tags) are already
+    # timed by the outer render
+    if not recorders or _rendering.get():
+        yield
+        return
+    token = _rendering.set(True)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _rendering.reset(token)
+        for recorder in recorders:
+            recorder.render_time += elapsed
+
+
+def _timed_render(self, context=None, request=None):
+    with timed_render():
+        return _original_render(self, context, request)
+
+
+@contextmanager
+def record_thread():
+    """
+    Records the queries of the current thread in the recorders active where
+    the work was submitted, for code run by worker threads: connections, so
+    their execute wrappers, are per thread.
+    """
+    with ExitStack() as stack:
+        for recorder in _recorders.get():
+            recorder.wrap_connections(stack)
+        yield
+
+
+# The same few statements are normalized over and over
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """
+    Returns `sql` with its literals and parameter lists replaced by ``?``,
+    so the runs of one query with different values are equal.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+class Recorder:
+    """
+    Context manager recording the queries run on every database connection,
+    as ``(sql, alias, seconds)`` tuples, and the render time.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.render_time = 0.0
+        self._stack = None
+        self._token = None
+
+    def __enter__(self):
+        # Installed once, a no-op outside of a recorder
+        Template.render = _timed_render
+        self._token = _recorders.set((*_recorders.get(), self))
+        self._stack = ExitStack()
+        self.wrap_connections(self._stack)
+        return self
+
+    def wrap_connections(self, stack):
+        """Records the queries of the connections of the current thread."""
+        for alias in connections:
+            stack.enter_context(
+                connections[alias].execute_wrapper(self._wrapper(alias))
+            )
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        _recorders.reset(self._token)
+
+    def _wrapper(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append((sql, alias, time.perf_counter() - start))
+
+        return wrapper
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def slowest(self, count):
+        """Returns the `count` slowest queries, as ``(seconds, sql)`` tuples."""
+        queries = sorted(self.queries, key=lambda query: query[2], reverse=True)
+        return [(duration, normalize_sql(sql)) for sql, _, duration in queries[:count]]
+
+    def repeated(self, threshold):
+        """
+        Returns the normalized queries run more than `threshold` times, with
+        their number of runs: the mark of a query run once per row (N+1).
+        """
+        counts = Counter(normalize_sql(sql) for sql, _, _ in self.queries)
+        return [(sql, n) for sql, n in counts.most_common() if n > threshold]
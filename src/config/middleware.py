@@ -0,0 +1,122 @@
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from config.instrumentation import Recorder
+from config.routers import RoutingState, routing_state
+
+logger = logging.getLogger("config.profiling")
+
+# Statements are cut in the log line, to keep it readable
+MAX_SQL_LENGTH = 300
+
+
+def shorten(sql):
+    return sql if len(sql) <= MAX_SQL_LENGTH else sql[: MAX_SQL_LENGTH - 3] + "..."
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests when PROFILING_ENABLED is set: the number and time
+    of the SQL queries, the template render time and the time left to the
+    view are sent as ``Server-Timing`` headers and as one JSON log line per
+    request. A query run more than PROFILING_REPEATED_QUERIES times by one
+    request, most likely once per row of a list (N+1), is logged as a warning.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with Recorder() as recorder:
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        db_time, render_time = recorder.sql_time, recorder.render_time
+        view_time = max(total - db_time - render_time, 0)
+        response["Server-Timing"] = ", ".join(
+            (
+                f'db;dur={db_time * 1000:.1f};desc="{recorder.query_count} queries"',
+                f"render;dur={render_time * 1000:.1f}",
+                f"view;dur={view_time * 1000:.1f}",
+                f"total;dur={total * 1000:.1f}",
+            )
+        )
+
+        match = request.resolver_match
+        repeated = recorder.repeated(settings.PROFILING_REPEATED_QUERIES)
+        line = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "queries": recorder.query_count,
+            "db_ms": round(db_time * 1000, 2),
+            "render_ms": round(render_time * 1000, 2),
+            "view_ms": round(view_time * 1000, 2),
+            "total_ms": round(total * 1000, 2),
+            "slowest": [
+                {"ms": round(duration * 1000, 2), "sql": shorten(sql)}
+                for duration, sql in recorder.slowest(settings.PROFILING_SLOW_QUERIES)
+            ],
+        }
+        if repeated:
+            line["repeated"] = [
+                {"count": n, "sql": shorten(sql)} for sql, n in repeated
+            ]
+            logger.warning(json.dumps(line))
+        else:
+            logger.info(json.dumps(line))
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets the GET requests of the views marked with ``replica_reads`` read
+    from a replica, picked once per request. A session that wrote in the
+    last DATABASE_STICKY_SECONDS reads from the primary, so users always see
+    their own writes even if the replicas lag behind.
+    """
+
+    session_key = "_db_primary_until"
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        if state.wrote and hasattr(request, "session"):
+            request.session[self.session_key] = (
+                time.time() + settings.DATABASE_STICKY_SECONDS
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = routing_state.get()
+        view = getattr(view_func, "view_class", view_func)
+        sticky_until = request.session.get(self.session_key, 0)
+        if (
+            getattr(view, "replica_reads", False)
+            and request.method in ("GET", "HEAD")
+            and time.time() >= sticky_until
+            and not state.wrote
+        ):
+            state.replica_reads = True
+            state.replica = random.choice(settings.DATABASE_REPLICAS)
@@ -0,0 +1,76 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.db import connections
+
+
+class ReadConnectionRouter:
+    """
+    Sends the reads to the query-only "read" connection of the tuned SQLite
+    mode, so they never wait behind the write lock of the "default" one.
+    Inside a transaction of "default", reads stay on it: they have to see
+    the transaction's own uncommitted writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if connections["default"].in_atomic_block:
+            return "default"
+        return "read"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+@dataclass
+class RoutingState:
+    """Database routing of the current request."""
+
+    # Reads may go to a replica: set by ReplicaRoutingMiddleware
+    replica_reads: bool = False
+    replica: str = "default"
+    # Something was written to the primary during the request
+    wrote: bool = False
+
+
+routing_state = ContextVar("routing_state", default=None)
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of the pages allowed by ReplicaRoutingMiddleware to a
+    replica, and everything else to the primary ("default"). Once a request
+    has written, its later reads go to the primary too, as do the reads
+    inside a transaction.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if (
+            state is None
+            or not state.replica_reads
+            or connections["default"].in_atomic_block
+        ):
+            return "default"
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        # Saving the session isn't a write the user may read back
+        if state is not None and model._meta.app_label != "sessions":
+            state.wrote = True
+            state.replica_reads = False
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas are copies of the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
@@ -0,0 +1,318 @@
+"""
+Read-only JSON API over the feed engine, for the mobile client and the
+integrations: the home feed, the user's posts, ticket details and follows,
+and the username suggestions of the follow form.
+
+Posts are serialized from ``.values()`` rows, without model instances. The
+``fields`` parameter picks the fields of the posts (``type``, ``id`` and
+``time_created`` are always sent) and every response has an ETag, so a
+client sending it back in If-None-Match gets an empty 304 when nothing
+changed.
+"""
+
+from operator import itemgetter
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import CharField, Q, Value
+from django.http import JsonResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    set_response_etag,
+)
+from django.views import View
+
+from authentication.models import User, username_key
+from config.instrumentation import timed_render
+from reviews import feed
+from reviews.models import Ticket
+from reviews.views import AsyncLoginRequiredMixin
+
+MAX_PAGE_SIZE = 100
+
+# Suggestions of the username autocomplete, cached per prefix: new users
+# show up once the entry expired
+MAX_SUGGESTIONS = 10
+SUGGESTIONS_TIMEOUT = 60
+
+IMAGE_STORAGE = Ticket._meta.get_field("image").storage
+
+
+def column(name):
+    return (name,), itemgetter(name)
+
+
+def image_url(row):
+    if not row["image"] or not row["image_ready"]:
+        return None
+    return IMAGE_STORAGE.url(row["image"])
+
+
+# Fields of the posts: name -> (columns read, value from the row)
+POST_FIELDS = {
+    feed.TICKET: {
+        "title": column("title"),
+        "description": column("description"),
+        "author": column("user__username"),
+        "image": (("image", "image_ready"), image_url),
+        "has_review": (("review_count",), lambda row: row["review_count"] > 0),
+        "review_count": column("review_count"),
+        "avg_rating": column("avg_rating"),
+    },
+    feed.REVIEW: {
+        "headline": column("headline"),
+        "body": column("body"),
+        "rating": column("rating"),
+        "author": column("user__username"),
+        "ticket_id": column("ticket_id"),
+        "ticket_title": column("ticket__title"),
+        "ticket_author": column("ticket__user__username"),
+    },
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class Serializer:
+    """Turns the rows of posts into dicts of the requested fields."""
+
+    def __init__(self, fields):
+        self.getters = {
+            content_type: [
+                (name, available[name][1]) for name in fields if name in available
+            ]
+            for content_type, available in POST_FIELDS.items()
+        }
+
+    def columns(self, content_type):
+        available = POST_FIELDS[content_type]
+        return [
+            name
+            for field, _ in self.getters[content_type]
+            for name in available[field][0]
+        ]
+
+    def serialize(self, row):
+        post = {
+            "type": row["content_type"].lower(),
+            "id": row["id"],
+            "time_created": row["time_created"],
+        }
+        for name, get in self.getters[row["content_type"]]:
+            post[name] = get(row)
+        return post
+
+
+class ApiView(AsyncLoginRequiredMixin, View):
+    """Base of the API views: JSON errors and conditional responses."""
+
+    http_method_names = ("get", "head", "options")
+    replica_reads = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({"error": error.message}, status=error.status)
+
+    def handle_no_permission(self):
+        return JsonResponse({"error": "Authentification requise."}, status=401)
+
+    def get_page_size(self):
+        try:
+            page_size = int(self.request.GET.get("limit", feed.DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ApiError("Paramètre limit invalide.")
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise ApiError(f"limit doit être entre 1 et {MAX_PAGE_SIZE}.")
+        return page_size
+
+    def get_serializer(self, content_types):
+        available = {
+            name for content_type in content_types for name in POST_FIELDS[content_type]
+        }
+        requested = self.request.GET.get("fields")
+        if not requested:
+            return Serializer(sorted(available))
+        fields = [name.strip() for name in requested.split(",") if name.strip()]
+        unknown = set(fields) - available - {"type", "id", "time_created"}
+        if unknown:
+            raise ApiError(f"Champs inconnus : {', '.join(sorted(unknown))}.")
+        return Serializer(fields)
+
+    def render_to_response(self, payload):
+        with timed_render():
+            response = JsonResponse(payload)
+        set_response_etag(response)
+        # Per-user data, revalidated on every use
+        patch_cache_control(response, private=True, no_cache=True)
+        return get_conditional_response(
+            self.request, etag=response["ETag"], response=response
+        )
+
+
+class PostsView(ApiView):
+    """
+    A feed as pages of posts, most recent first. The next page is requested
+    with the ``next_cursor`` of the previous one as ``cursor`` parameter.
+    """
+
+    def get_feed_streams(self):
+        """Returns the (content_type, queryset) pairs to merge."""
+        raise NotImplementedError
+
+    def get_cursor(self):
+        try:
+            return feed.Cursor.decode(self.request.GET.get("cursor"))
+        except ValueError:
+            raise ApiError("Curseur invalide.")
+
+    async def get(self, request, *args, **kwargs):
+        streams = self.get_feed_streams()
+        serializer = self.get_serializer({content_type for content_type, _ in streams})
+        page = await feed.aget_values_page(
+            streams,
+            {
+                content_type: serializer.columns(content_type)
+                for content_type, _ in streams
+            },
+            self.get_cursor(),
+            self.get_page_size(),
+        )
+        with timed_render():
+            results = [serializer.serialize(row) for row in page.posts]
+        return self.render_to_response(
+            {"results": results, "next_cursor": page.next_token}
+        )
+
+
+class FeedView(PostsView):
+    """The home feed of the user."""
+
+    def get_feed_streams(self):
+        return feed.home_streams(self.request.user)
+
+
+class UserPostsView(PostsView):
+    """The tickets and reviews written by the user."""
+
+    def get_feed_streams(self):
+        user = self.request.user
+        return [(feed.TICKET, user.tickets.all()), (feed.REVIEW, user.reviews.all())]
+
+
+class TicketDetailView(ApiView):
+    """A ticket, with the same fields as in the feeds."""
+
+    async def get(self, request, pk, *args, **kwargs):
+        serializer = self.get_serializer([feed.TICKET])
+        columns = serializer.columns(feed.TICKET)
+        row = await (
+            Ticket.objects.filter(pk=pk)
+            .annotate(content_type=Value(feed.TICKET, CharField()))
+            .values("id", "time_created", "content_type", *columns)
+            .afirst()
+        )
+        if row is None:
+            raise ApiError("Ticket introuvable.", status=404)
+        with timed_render():
+            ticket = serializer.serialize(row)
+        return self.render_to_response(ticket)
+
+
+class FollowsView(ApiView):
+    """
+    Pages of the users followed by the user (``following``) or following
+    them (``followers``), most recent follow first. The cursor is the id of
+    the last follow of the previous page.
+    """
+
+    relation = "following"
+
+    def get_follows(self):
+        """Returns the (follow id, user id, username) rows of the relation."""
+        user = self.request.user
+        if self.relation == "following":
+            return user.following.values_list(
+                "id", "followed_user_id", "followed_user__username"
+            )
+        return user.followed_by.values_list("id", "user_id", "user__username")
+
+    def get_cursor(self):
+        cursor = self.request.GET.get("cursor")
+        if not cursor:
+            return None
+        try:
+            return int(cursor)
+        except ValueError:
+            raise ApiError("Curseur invalide.")
+
+    async def get(self, request, *args, **kwargs):
+        page_size = self.get_page_size()
+        follows = self.get_follows().order_by("-id")
+        cursor = self.get_cursor()
+        if cursor is not None:
+            follows = follows.filter(id__lt=cursor)
+        # One extra follow tells whether there is a next page
+        results = [
+            {"id": follow_id, "user_id": user_id, "username": username}
+            async for follow_id, user_id, username in follows[: page_size + 1]
+        ]
+        next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            next_cursor = str(results[-1]["id"])
+        return self.render_to_response({"results": results, "next_cursor": next_cursor})
+
+
+class UsernamesView(ApiView):
+    """
+    Usernames starting with the ``q`` parameter, ignoring case and accents,
+    for the autocomplete of the follow form.
+    """
+
+    def get_prefix(self):
+        prefix = username_key(self.request.GET.get("q", "").strip())
+        if len(prefix) > User._meta.get_field("username_key").max_length:
+            raise ApiError("Paramètre q trop long.")
+        return prefix
+
+    def starts_with(self, prefix, using):
+        """
+        Condition on the username keys starting with `prefix`, read as a
+        range of an index in key order until the limit.
+        """
+        if connections[using].vendor == "sqlite":
+            # SQLite can't read LIKE from an index of the default binary
+            # collation, in which these keys are a range
+            return Q(username_key__gte=prefix, username_key__lt=prefix + chr(0x10FFFF))
+        # The range would follow the collation of the database: LIKE reads
+        # the varchar_pattern_ops index of indexed CharFields on PostgreSQL
+        return Q(username_key__startswith=prefix)
+
+    async def get_suggestions(self, prefix):
+        cache_key = f"usernames:{quote(prefix)}"
+        usernames = await cache.aget(cache_key)
+        if usernames is None:
+            users = User.objects.filter(is_active=True)
+            users = users.filter(self.starts_with(prefix, users.db))
+            usernames = [
+                username
+                async for username in users.order_by("username_key").values_list(
+                    "username", flat=True
+                )[:MAX_SUGGESTIONS]
+            ]
+            await cache.aset(cache_key, usernames, SUGGESTIONS_TIMEOUT)
+        return usernames
+
+    async def get(self, request, *args, **kwargs):
+        prefix = self.get_prefix()
+        usernames = await self.get_suggestions(prefix) if prefix else []
+        return self.render_to_response({"results": usernames})
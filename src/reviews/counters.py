@@ -0,0 +1,191 @@
+"""
+Denormalized counters: the number of reviews and the average rating of the
+tickets, and the number of tickets, reviews, followers and followed users
+of the users, so pages and stats read a column instead of aggregating.
+
+The signals update them with F() expressions, computed by the database in
+the UPDATE itself, so concurrent writes can't lose an increment. Writes
+that bypass the signals (bulk_create, raw deletes) must be followed by
+`recount`; `reconcile` finds and repairs counters that drifted anyway.
+"""
+
+import operator
+from functools import reduce
+
+from django.contrib.auth import get_user_model
+from django.db.models import (
+    Avg,
+    Case,
+    Count,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Abs, Coalesce, Greatest
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from reviews.models import Review, Ticket, UserFollows
+
+User = get_user_model()
+
+# Incremental averages differ from AVG() in the last digits
+AVG_TOLERANCE = 1e-6
+
+
+def increment(field):
+    return F(field) + 1
+
+
+def decrement(field):
+    # A counter that drifted to 0 stays there until reconciled
+    return Greatest(F(field) - 1, Value(0))
+
+
+def review_added(review):
+    # Every expression reads the values from before the UPDATE
+    Ticket.objects.filter(id=review.ticket_id).update(
+        avg_rating=(
+            Coalesce(F("avg_rating"), Value(0.0)) * F("review_count") + review.rating
+        )
+        / (F("review_count") + 1),
+        review_count=increment("review_count"),
+        # Shows or hides the review button of the ticket page
+        time_updated=timezone.now(),
+    )
+    User.objects.filter(id=review.user_id).update(
+        review_count=increment("review_count")
+    )
+
+
+def review_removed(review):
+    Ticket.objects.filter(id=review.ticket_id).update(
+        avg_rating=Case(
+            When(review_count__lte=1, then=Value(None)),
+            default=(F("avg_rating") * F("review_count") - review.rating)
+            / (F("review_count") - 1),
+            output_field=FloatField(),
+        ),
+        review_count=decrement("review_count"),
+        time_updated=timezone.now(),
+    )
+    User.objects.filter(id=review.user_id).update(
+        review_count=decrement("review_count")
+    )
+
+
+def review_edited(review):
+    # The previous rating is unknown: the average is recomputed
+    Ticket.objects.filter(id=review.ticket_id).update(avg_rating=average_rating())
+
+
+def ticket_added(ticket):
+    User.objects.filter(id=ticket.user_id).update(
+        ticket_count=increment("ticket_count")
+    )
+
+
+def ticket_removed(ticket):
+    User.objects.filter(id=ticket.user_id).update(
+        ticket_count=decrement("ticket_count")
+    )
+
+
+def follow_added(follow):
+    User.objects.filter(id=follow.user_id).update(
+        following_count=increment("following_count")
+    )
+    User.objects.filter(id=follow.followed_user_id).update(
+        follower_count=increment("follower_count")
+    )
+
+
+def follow_removed(follow):
+    User.objects.filter(id=follow.user_id).update(
+        following_count=decrement("following_count")
+    )
+    User.objects.filter(id=follow.followed_user_id).update(
+        follower_count=decrement("follower_count")
+    )
+
+
+def count(model, field):
+    """Number of rows of `model` whose `field` references the outer row."""
+    rows = model.objects.filter(**{field: OuterRef("pk")}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(n=Count("*")).values("n")), 0)
+
+
+def average_rating():
+    ratings = Review.objects.filter(ticket=OuterRef("pk")).order_by().values("ticket")
+    return Subquery(ratings.annotate(avg=Avg("rating")).values("avg"))
+
+
+def get_counters():
+    """Returns the expressions computing the counters, per model."""
+    return {
+        Ticket: {
+            "review_count": count(Review, "ticket"),
+            "avg_rating": average_rating(),
+        },
+        User: {
+            "ticket_count": count(Ticket, "user"),
+            "review_count": count(Review, "user"),
+            "follower_count": count(UserFollows, "followed_user"),
+            "following_count": count(UserFollows, "user"),
+        },
+    }
+
+
+def recount():
+    """Recomputes every counter from the tables."""
+    for model, expressions in get_counters().items():
+        model.objects.update(**expressions)
+
+
+def recount_users(user_ids):
+    """Recomputes the counters of some users, after a bulk write."""
+    User.objects.filter(id__in=user_ids).update(**get_counters()[User])
+
+
+def differs(model, field, actual):
+    if not isinstance(model._meta.get_field(field), FloatField):
+        return ~Q(**{field: F(actual)})
+    null_mismatch = Q(**{f"{field}__isnull": True}) ^ Q(**{f"{actual}__isnull": True})
+    return null_mismatch | Q(
+        GreaterThan(Abs(F(field) - F(actual)), Value(AVG_TOLERANCE))
+    )
+
+
+def reconcile(dry_run=False):
+    """
+    Finds the counters that differ from the tables and, unless `dry_run`,
+    repairs them. Returns the number of wrong rows per "Model.field".
+    """
+    drift = {}
+    for model, expressions in get_counters().items():
+        rows = model.objects.annotate(
+            **{
+                f"actual_{field}": expression
+                for field, expression in expressions.items()
+            }
+        )
+        conditions = {
+            field: differs(model, field, f"actual_{field}") for field in expressions
+        }
+        wrong = rows.aggregate(
+            **{
+                field: Count("pk", filter=condition)
+                for field, condition in conditions.items()
+            }
+        )
+        drift.update(
+            {f"{model.__name__}.{field}": wrong[field] for field in expressions}
+        )
+        if not dry_run and any(wrong.values()):
+            stale = rows.filter(reduce(operator.or_, conditions.values()))
+            model.objects.filter(pk__in=stale.values("pk")).update(**expressions)
+    return drift
@@ -0,0 +1,255 @@
+"""
+Feed engine.
+
+Tickets and reviews are read as streams ordered by
+``(time_created, content_type, id)`` descending. Each stream is bounded by
+a keyset condition and a LIMIT, then the streams are merged, so the cost of
+a page depends on the page size and not on the number of posts in the feed.
+The async views run the stream queries concurrently when the connections
+are persistent (see `fetch_all`), and the JSON API reads them as dicts (see
+`values_stream`).
+"""
+
+import asyncio
+import base64
+import heapq
+import json
+import operator
+from dataclasses import dataclass
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connections
+from django.db.models import CharField, Q, Value
+
+from config.instrumentation import record_thread
+
+TICKET = "TICKET"
+REVIEW = "REVIEW"
+
+DEFAULT_PAGE_SIZE = 20
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """Position of the last post of a page, used to fetch the next one."""
+
+    time_created: datetime
+    content_type: str
+    id: int
+
+    def encode(self):
+        """Returns the cursor as an opaque url-safe token."""
+        payload = json.dumps(
+            [self.time_created.isoformat(), self.content_type, self.id]
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token):
+        """
+        Builds a cursor from a token made by `encode`.
+        Returns None for an empty token, raises ValueError if it is invalid.
+        """
+        if not token:
+            return None
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            time_created, content_type, pk = json.loads(
+                base64.urlsafe_b64decode(padded.encode())
+            )
+            cursor = cls(datetime.fromisoformat(time_created), content_type, int(pk))
+        except (TypeError, ValueError) as error:
+            raise ValueError("Invalid feed cursor") from error
+        if cursor.content_type not in (TICKET, REVIEW):
+            raise ValueError("Invalid feed cursor")
+        return cursor
+
+    @classmethod
+    def from_post(cls, post):
+        return cls(post.time_created, post.content_type, post.id)
+
+
+@dataclass
+class FeedPage:
+    posts: list
+    next_cursor: Cursor | None
+
+    @property
+    def next_token(self):
+        return self.next_cursor.encode() if self.next_cursor else None
+
+
+def sort_key(post):
+    return post.time_created, post.content_type, post.id
+
+
+def after_cursor(queryset, content_type, cursor):
+    """
+    Restricts a stream of `content_type` posts to the ones placed after
+    `cursor` in the feed order.
+    """
+    if cursor is None:
+        return queryset
+    if content_type == cursor.content_type:
+        # The leading bound keeps the condition usable as an index range
+        return queryset.filter(
+            Q(time_created__lt=cursor.time_created) | Q(id__lt=cursor.id),
+            time_created__lte=cursor.time_created,
+        )
+    if content_type < cursor.content_type:
+        # Same timestamp but sorted after the cursor type: still to come
+        return queryset.filter(time_created__lte=cursor.time_created)
+    return queryset.filter(time_created__lt=cursor.time_created)
+
+
+def load_tickets(queryset):
+    """Loads tickets with everything their card displays."""
+    return queryset.select_related("user")
+
+
+def load_reviews(queryset):
+    """Loads reviews with everything their card and nested ticket display."""
+    return queryset.select_related("user", "ticket__user")
+
+
+LOADERS = {TICKET: load_tickets, REVIEW: load_reviews}
+
+
+def ordered_stream(queryset, content_type, cursor, limit):
+    """Returns at most `limit` posts of the stream, in feed order."""
+    queryset = LOADERS[content_type](after_cursor(queryset, content_type, cursor))
+    queryset = queryset.annotate(content_type=Value(content_type, CharField()))
+    return queryset.order_by("-time_created", "-id")[:limit]
+
+
+def values_stream(queryset, content_type, cursor, limit, columns):
+    """
+    Fast path of `ordered_stream` for the serializers: the posts are dicts
+    of `columns`, plus the sort key, read with ``.values()`` without
+    instantiating models.
+    """
+    queryset = after_cursor(queryset, content_type, cursor)
+    queryset = queryset.annotate(content_type=Value(content_type, CharField()))
+    columns = dict.fromkeys(["id", "time_created", "content_type", *columns])
+    return queryset.order_by("-time_created", "-id").values(*columns)[:limit]
+
+
+row_sort_key = operator.itemgetter("time_created", "content_type", "id")
+
+
+def home_streams(user):
+    """Streams of the home feed of `user`."""
+    return [
+        (TICKET, user.get_viewable_tickets()),
+        (REVIEW, user.get_followed_reviews()),
+        (REVIEW, user.get_replies()),
+    ]
+
+
+def merge_page(ordered_streams, page_size, key=sort_key):
+    """
+    Merges streams of at most ``page_size + 1`` posts, in feed order, into
+    a page. `key` returns the sort key of a post, the fields of its cursor.
+    """
+    # One extra post tells whether there is a next page
+    merged = heapq.merge(*ordered_streams, key=key, reverse=True)
+    posts = [post for _, post in zip(range(page_size + 1), merged)]
+
+    next_cursor = None
+    if len(posts) > page_size:
+        posts = posts[:page_size]
+        next_cursor = Cursor(*key(posts[-1]))
+    return FeedPage(posts=posts, next_cursor=next_cursor)
+
+
+def page_version(page):
+    """
+    Returns a string identifying the posts of `page` as displayed: it
+    changes when one of them is added, removed or edited, including the
+    ticket of a review, and when the page gains or loses a next page.
+    """
+    parts = [page.next_token]
+    for post in page.posts:
+        parts.append(f"{post.content_type}{post.id}@{post.time_updated.timestamp()}")
+        if post.content_type == REVIEW:
+            parts.append(f"{post.ticket_id}@{post.ticket.time_updated.timestamp()}")
+    return ",".join(map(str, parts))
+
+
+def get_page(streams, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Returns the page of the feed that starts right after `cursor`.
+    `streams` is a list of (content_type, queryset) pairs which must not
+    share any post.
+    """
+    ordered_streams = [
+        ordered_stream(queryset, content_type, cursor, page_size + 1)
+        for content_type, queryset in streams
+    ]
+    return merge_page(ordered_streams, page_size)
+
+
+def fetch(queryset):
+    """
+    Evaluates `queryset` in a worker thread, on the thread's own database
+    connection, which is closed afterwards unless CONN_MAX_AGE keeps it.
+    """
+    try:
+        with record_thread():
+            return list(queryset)
+    finally:
+        close_old_connections()
+
+
+def fetch_each(querysets):
+    return [list(queryset) for queryset in querysets]
+
+
+def has_persistent_connection(queryset):
+    return connections[queryset.db].settings_dict["CONN_MAX_AGE"] != 0
+
+
+async def fetch_all(querysets):
+    """
+    Evaluates `querysets` at the same time, each in its own thread and
+    connection, instead of one after the other in the thread of the async
+    ORM. The concurrent reads only pay off with persistent connections:
+    without CONN_MAX_AGE, each thread would open and close a connection per
+    page, so the querysets run one after the other on the connection of the
+    async ORM. Either way, outside a transaction, each query reads its own
+    snapshot: the streams don't share posts, so a post written in between
+    is at worst missing from this page and shown on the next load.
+    """
+    querysets = list(querysets)
+    if not all(map(has_persistent_connection, querysets)):
+        return await sync_to_async(fetch_each)(querysets)
+    return await asyncio.gather(
+        *(
+            sync_to_async(fetch, thread_sensitive=False)(queryset)
+            for queryset in querysets
+        )
+    )
+
+
+async def aget_page(streams, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Async get_page. The streams don't depend on each other."""
+    ordered_streams = await fetch_all(
+        ordered_stream(queryset, content_type, cursor, page_size + 1)
+        for content_type, queryset in streams
+    )
+    return merge_page(ordered_streams, page_size)
+
+
+async def aget_values_page(streams, columns, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    aget_page reading the posts with `values_stream`: `columns` maps a
+    content type to the columns of its posts.
+    """
+    ordered_streams = await fetch_all(
+        values_stream(
+            queryset, content_type, cursor, page_size + 1, columns[content_type]
+        )
+        for content_type, queryset in streams
+    )
+    return merge_page(ordered_streams, page_size, key=row_sort_key)
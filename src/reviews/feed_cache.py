@@ -0,0 +1,153 @@
+"""
+Per-user cache of feed pages, and cached post cards.
+
+A page is cached under the owner's feed version. Writing a post changes the
+version of every reader of its author (and, for a ticket, of the authors of
+its reviews, whose cards show it), and follow or block changes change the
+version of the affected users, so stale pages are never read again and
+simply age out of the cache. The versions must be shared by every process
+that writes: see the FEED_CACHE_ENABLED setting.
+"""
+
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+
+from reviews.models import Review, Ticket, UserFollows
+
+CACHE_ALIAS = "feed"
+FRAGMENT_CACHE_ALIAS = "template_fragments"
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def version_key(user_id):
+    return f"feed:version:{user_id}"
+
+
+def new_version():
+    # Unique over time, so a version evicted from the cache and recreated
+    # can't match the version of pages cached before the eviction.
+    return time.time_ns()
+
+
+def get_version(user_id):
+    cache = get_cache()
+    return cache.get_or_set(version_key(user_id), new_version, timeout=None)
+
+
+def bump_versions(user_ids):
+    """
+    Invalidates every cached page of the feeds of `user_ids`, once the
+    current transaction commits: bumped before, a concurrent request could
+    cache the page without the write under the new version.
+    """
+    user_ids = set(user_ids)
+
+    def bump():
+        version = new_version()
+        get_cache().set_many(
+            {version_key(user_id): version for user_id in user_ids}, timeout=None
+        )
+
+    transaction.on_commit(bump)
+
+
+def bump_readers(*author_ids):
+    """Invalidates the feeds of the given authors and of their followers."""
+    followers = UserFollows.objects.filter(followed_user_id__in=author_ids)
+    bump_versions([*author_ids, *followers.values_list("user_id", flat=True)])
+
+
+def bump_ticket_readers(ticket):
+    """
+    Invalidates the feeds showing `ticket`: also the ones showing it inside
+    the card of one of its reviews.
+    """
+    reviewer_ids = Review.objects.filter(ticket_id=ticket.id).values_list(
+        "user_id", flat=True
+    )
+    bump_readers(ticket.user_id, *reviewer_ids)
+
+
+def bump_review_readers(review):
+    """Invalidates the feeds showing `review`: also its ticket author's."""
+    ticket_user_ids = Ticket.objects.filter(id=review.ticket_id).values_list(
+        "user_id", flat=True
+    )
+    bump_readers(review.user_id, *ticket_user_ids)
+
+
+def page_key(user_id, version, cursor, page_size):
+    token = cursor.encode() if cursor else "first"
+    return f"feed:page:{user_id}:{version}:{page_size}:{token}"
+
+
+def record(counter):
+    cache = get_cache()
+    key = f"feed:stats:{counter}"
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def stats():
+    """Returns the hit and miss counters of the page cache."""
+    cache = get_cache()
+    values = cache.get_many(["feed:stats:hits", "feed:stats:misses"])
+    return {
+        "hits": values.get("feed:stats:hits", 0),
+        "misses": values.get("feed:stats:misses", 0),
+    }
+
+
+def lookup(user, cursor, page_size):
+    """Returns the cache key of a feed page and the cached page, or None."""
+    key = page_key(user.id, get_version(user.id), cursor, page_size)
+    page = get_cache().get(key)
+    record("misses" if page is None else "hits")
+    return key, page
+
+
+def get_page(user, cursor, page_size, build_page):
+    """
+    Returns the cached feed page of `user` at `cursor`, or builds it with
+    `build_page()` and caches it.
+    """
+    key, page = lookup(user, cursor, page_size)
+    if page is None:
+        page = build_page()
+        get_cache().set(key, page)
+    return page
+
+
+async def aget_page(user, cursor, page_size, abuild_page):
+    """Async get_page, `abuild_page` being a coroutine function."""
+    # One thread switch for the version, page and counter lookups
+    key, page = await sync_to_async(lookup)(user, cursor, page_size)
+    if page is None:
+        page = await abuild_page()
+        await get_cache().aset(key, page)
+    return page
+
+
+def delete_card_fragment(fragment_name, post):
+    """
+    Drops the cached cards of `post`, one per language. Edits don't need
+    it: the card key includes time_updated, so an edited post gets a new
+    card.
+    """
+    keys = [
+        make_template_fragment_key(fragment_name, [post.id, post.time_updated, code])
+        for code, _ in settings.LANGUAGES
+    ]
+    caches[FRAGMENT_CACHE_ALIAS].delete_many(keys)
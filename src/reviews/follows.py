@@ -0,0 +1,162 @@
+"""
+Pages of follows, and follows and unfollows of many users at once, for the
+subscriptions pages and the ``import_follows`` command.
+
+A batch reads its users in one query and writes its follows in one
+statement, without the per-row signals. What the signals do for a single
+follow is then done once for the whole batch: the counters of the users
+involved are recomputed, the feed of the follower is invalidated once, and
+its inbox is backfilled or purged for all the users at once. The search
+index doesn't depend on the follows: visibility is checked at query time.
+"""
+
+from dataclasses import dataclass, field
+
+from django.contrib.auth import get_user_model
+from django.db import connections, router, transaction
+
+from reviews import counters, feed_cache, inbox
+from reviews.models import UserFollows
+
+User = get_user_model()
+
+# Usernames per batch: one query to read them, one write, one invalidation
+BATCH_SIZE = 1000
+
+PAGE_SIZE = 20
+
+
+def get_page(follows, cursor=None, page_size=PAGE_SIZE):
+    """
+    Returns the follows of `follows`, most recent first, placed after the
+    follow whose id is `cursor`, and the cursor of the next page, or None.
+    With a user's follows or followers, the page is a range of one of the
+    (user, -id) indexes: its cost doesn't depend on the number of follows.
+    """
+    follows = follows.order_by("-id")
+    if cursor is not None:
+        follows = follows.filter(id__lt=cursor)
+    # One extra follow tells whether there is a next page
+    page = list(follows[: page_size + 1])
+    if len(page) > page_size:
+        return page[:page_size], page[page_size - 1].id
+    return page, None
+
+
+@dataclass
+class BatchResult:
+    """Usernames of a batch, by outcome."""
+
+    changed: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+    unknown: list = field(default_factory=list)
+
+    def update(self, other):
+        self.changed += other.changed
+        self.unchanged += other.unchanged
+        self.unknown += other.unknown
+
+
+def resolve(usernames):
+    """Returns the id of each existing username of `usernames`, in one query."""
+    return dict(
+        User.objects.filter(username__in=set(usernames)).values_list("username", "id")
+    )
+
+
+def split(user, usernames, followed):
+    """
+    Sorts `usernames` into the ones `user` follows (`followed` True) or
+    doesn't follow, the other ones, and the unknown ones. Returns the ids
+    of the first ones and the result of the batch.
+    """
+    ids = resolve(usernames)
+    # Following oneself is left out
+    is_self = ids.pop(user.username, None) is not None
+    following = set(
+        user.following.filter(followed_user_id__in=ids.values()).values_list(
+            "followed_user_id", flat=True
+        )
+    )
+    result = BatchResult(
+        unchanged=[user.username] if is_self else [],
+        unknown=sorted(set(usernames) - ids.keys() - {user.username}),
+    )
+    for username, user_id in sorted(ids.items()):
+        if (user_id in following) == followed:
+            result.changed.append(username)
+        else:
+            result.unchanged.append(username)
+    return [ids[username] for username in result.changed], result
+
+
+def after_batch(user, user_ids):
+    """
+    Does once what the signals do for each follow or unfollow. The feed
+    version is bumped when the batch transaction commits.
+    """
+    counters.recount_users([user.id, *user_ids])
+    feed_cache.bump_versions([user.id])
+
+
+@transaction.atomic
+def follow_batch(user, usernames):
+    """Makes `user` follow the users of `usernames`, at most BATCH_SIZE."""
+    user_ids, result = split(user, usernames, followed=False)
+    if user_ids:
+        # A follow created since `split` is skipped by the constraint
+        UserFollows.objects.bulk_create(
+            [UserFollows(user=user, followed_user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        if inbox.is_enabled():
+            inbox.backfill_follows(user.id, user_ids)
+        after_batch(user, user_ids)
+    return result
+
+
+def delete_follows(user, user_ids):
+    """
+    Deletes the follows of `user` to `user_ids` in a single DELETE.
+    QuerySet.delete() would load the rows and send post_delete for each one,
+    since UserFollows has receivers (inbox, counters, feed cache), which
+    after_batch replaces. Nothing references UserFollows, so there is
+    nothing to cascade.
+    """
+    using = router.db_for_write(UserFollows)
+    quote_name = connections[using].ops.quote_name
+    opts = UserFollows._meta
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote_name(opts.db_table)} "
+            f"WHERE {quote_name(opts.get_field('user').column)} = %s "
+            f"AND {quote_name(opts.get_field('followed_user').column)} "
+            f"IN ({placeholders})",
+            [user.id, *user_ids],
+        )
+
+
+@transaction.atomic
+def unfollow_batch(user, usernames):
+    """Makes `user` unfollow the users of `usernames`, at most BATCH_SIZE."""
+    user_ids, result = split(user, usernames, followed=True)
+    if user_ids:
+        delete_follows(user, user_ids)
+        if inbox.is_enabled():
+            inbox.purge_follows(user.id, user_ids)
+        after_batch(user, user_ids)
+    return result
+
+
+def follow_many(user, usernames, unfollow=False):
+    """
+    Follows, or unfollows, the users of `usernames` in batches of
+    BATCH_SIZE, and returns the result of all of them.
+    """
+    apply_batch = unfollow_batch if unfollow else follow_batch
+    usernames = list(dict.fromkeys(usernames))
+    result = BatchResult()
+    for start in range(0, len(usernames), BATCH_SIZE):
+        result.update(apply_batch(user, usernames[start : start + BATCH_SIZE]))
+    return result
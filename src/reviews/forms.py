@@ -1,12 +1,16 @@
+import re
+
 from crispy_forms.bootstrap import InlineRadios, FieldWithButtons
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit, Layout, Field
 from django import forms
 from django.core.exceptions import ValidationError
-from django.forms import RadioSelect, Textarea, CharField
+from django.forms import RadioSelect, Textarea, CharField, ChoiceField
+from django.urls import reverse_lazy
 from django.utils.translation import gettext as _
 
 from authentication.models import User
+from reviews import follows, jobs
 from reviews.models import Ticket, Review
 
 
@@ -31,6 +35,17 @@ class TicketForm(forms.ModelForm):
             "image",
         )
 
+    def save(self, commit=True):
+        image_changed = "image" in self.changed_data
+        if image_changed:
+            self.instance.image_variants = {}
+            # Shows a placeholder until the image job has run
+            self.instance.image_ready = not self.instance.image
+        ticket = super().save(commit=commit)
+        if commit and image_changed and ticket.image:
+            jobs.enqueue(ticket)
+        return ticket
+
 
 class ReviewForm(forms.ModelForm):
     class Meta:
@@ -70,6 +85,9 @@ class UserFollowForm(forms.Form):
                     "username",
                     placeholder="Nom d'utilisateur",
                     aria_label="Nom d'utilisateur",
+                    autocomplete="off",
+                    list="username-suggestions",
+                    data_autocomplete_url=reverse_lazy("api-usernames"),
                 ),
                 Submit("submit", "Suivre"),
             ),
@@ -77,8 +95,52 @@ class UserFollowForm(forms.Form):
 
     def clean_username(self):
         data = self.cleaned_data["username"]
-        if not User.objects.filter(username=data).exists():
+        # Kept for the view, which doesn't have to read the user again
+        self.followed_user = User.objects.filter(username=data).first()
+        if self.followed_user is None:
             raise ValidationError(
                 _("Ce nom d'utilisateur n'existe pas."), code="bad_username"
             )
         return data
+
+
+class UserFollowBulkForm(forms.Form):
+    FOLLOW = "follow"
+    UNFOLLOW = "unfollow"
+
+    usernames = CharField(
+        label="Noms d'utilisateur",
+        widget=Textarea(attrs={"rows": 6}),
+        help_text="Un nom par ligne, ou séparés par des virgules.",
+    )
+    action = ChoiceField(
+        label="Action",
+        choices=[(FOLLOW, "Suivre"), (UNFOLLOW, "Ne plus suivre")],
+        initial=FOLLOW,
+        widget=RadioSelect,
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_id = "FollowBulkForm"
+        self.helper.form_method = "post"
+        self.helper.layout = Layout(
+            "usernames",
+            InlineRadios("action"),
+            Submit("submit", "Valider"),
+        )
+
+    def clean_usernames(self):
+        usernames = [
+            name
+            for name in re.split(r"[\s,;]+", self.cleaned_data["usernames"])
+            if name
+        ]
+        if len(usernames) > follows.BATCH_SIZE:
+            raise ValidationError(
+                _("Au plus %(max)d noms à la fois."),
+                code="too_many_usernames",
+                params={"max": follows.BATCH_SIZE},
+            )
+        return usernames
@@ -0,0 +1,141 @@
+"""
+Ticket image pipeline.
+
+Stored uploads are re-encoded without their metadata and capped in size,
+then fixed-width thumbnails are rendered in WebP and JPEG so the feed cards
+can pick the smallest suitable file with ``srcset``. Uploads are processed
+outside of the request by the jobs of reviews.jobs.
+"""
+
+import io
+import random
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageDraw, ImageOps
+
+MAX_SIZE = (1600, 1600)
+THUMBNAIL_WIDTHS = (320, 640)
+THUMBNAIL_DIR = "thumbs"
+# Format name used by Pillow for each variant extension
+VARIANT_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+QUALITY = 82
+
+
+def open_image(data):
+    image = Image.open(io.BytesIO(data))
+    # Apply the EXIF orientation before the metadata is dropped
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    return image
+
+
+def encode(image, image_format):
+    # Saving without `exif`/`icc_profile` arguments strips the metadata
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def sanitize(data):
+    """Returns the image `data` as a JPEG without metadata, capped in size."""
+    image = open_image(data)
+    image.thumbnail(MAX_SIZE)
+    return encode(image, "JPEG")
+
+
+def render_variants(data):
+    """
+    Returns the thumbnails of the image `data` as a
+    ``{extension: {width: bytes}}`` dict. Widths larger than the image are
+    skipped, but the smallest one is always rendered.
+    """
+    image = open_image(data)
+    widths = [w for w in THUMBNAIL_WIDTHS if w < image.width] or THUMBNAIL_WIDTHS[:1]
+    variants = {extension: {} for extension in VARIANT_FORMATS}
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        thumbnail = image.resize((width, height), Image.Resampling.LANCZOS)
+        for extension, image_format in VARIANT_FORMATS.items():
+            variants[extension][width] = encode(thumbnail, image_format)
+    return variants
+
+
+def process_file(data):
+    """Sanitizes an image and renders its thumbnails. Safe in a worker process."""
+    sanitized = sanitize(data)
+    return sanitized, render_variants(sanitized)
+
+
+def save_variants(image_name, variants, storage=default_storage):
+    """
+    Stores the rendered thumbnails of `image_name` and returns their names
+    as a ``{extension: {width: name}}`` dict, for Ticket.image_variants.
+    """
+    stem = PurePosixPath(image_name).stem
+    names = {}
+    for extension, files in variants.items():
+        names[extension] = {}
+        for width, data in files.items():
+            name = f"{THUMBNAIL_DIR}/{stem}_{width}.{extension}"
+            if storage.exists(name):
+                storage.delete(name)
+            names[extension][str(width)] = storage.save(name, ContentFile(data))
+    return names
+
+
+def render_placeholder(seed, width, height):
+    """
+    Returns a random but reproducible JPEG picture, used to seed the
+    database without downloading images. Safe in a worker process.
+    """
+    rng = random.Random(seed)
+    start, end = (
+        tuple(rng.randrange(256) for _ in range(3)),
+        tuple(rng.randrange(256) for _ in range(3)),
+    )
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.composite(
+        Image.new("RGB", (width, height), start),
+        Image.new("RGB", (width, height), end),
+        gradient,
+    )
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(3, 8)):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randint(10, min(width, height) // 3)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+    return encode(image, "JPEG")
+
+
+def read_image(ticket):
+    with ticket.image.open("rb") as image_file:
+        return image_file.read()
+
+
+def store_processed(ticket, sanitized, variants):
+    """
+    Replaces the stored image of `ticket` by its sanitized copy and records
+    its thumbnails.
+    """
+    storage = ticket.image.storage
+    old_name = ticket.image.name
+    name = str(PurePosixPath(old_name).with_suffix(".jpg"))
+    # The original is already in memory and is replaced by its sanitized copy
+    storage.delete(old_name)
+    ticket.image.name = storage.save(name, ContentFile(sanitized))
+    ticket.image_variants = save_variants(ticket.image.name, variants)
+    ticket.image_ready = True
+    # time_updated is the version of the cached card, which shows the image
+    ticket.save(
+        update_fields=["image", "image_variants", "image_ready", "time_updated"]
+    )
+
+
+def process_ticket_image(ticket):
+    """Runs the whole pipeline on the stored image of `ticket`."""
+    sanitized, variants = process_file(read_image(ticket))
+    store_processed(ticket, sanitized, variants)
@@ -0,0 +1,134 @@
+"""
+Materialized feed (fan-out on write).
+
+When FEED_FANOUT_ON_WRITE is enabled, every post is pushed to the inbox of
+each user who can see it, and follow changes backfill or purge the affected
+entries. Reading a feed page is then a single range scan on FeedEntry.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+
+from reviews import feed
+from reviews.models import FeedEntry, Review, Ticket, UserFollows
+
+BATCH_SIZE = 1000
+
+
+def is_enabled():
+    return getattr(settings, "FEED_FANOUT_ON_WRITE", False)
+
+
+def follower_ids(user_id):
+    return UserFollows.objects.filter(followed_user_id=user_id).values_list(
+        "user_id", flat=True
+    )
+
+
+def make_entry(owner_id, post, content_type):
+    return FeedEntry(
+        owner_id=owner_id,
+        ticket_id=post.id if content_type == feed.TICKET else None,
+        review_id=post.id if content_type == feed.REVIEW else None,
+        content_type=content_type,
+        post_id=post.id,
+        time_created=post.time_created,
+    )
+
+
+def save_entries(entries):
+    FeedEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def push_ticket(ticket):
+    """Adds a new ticket to the inbox of its author and their followers."""
+    owner_ids = {ticket.user_id, *follower_ids(ticket.user_id)}
+    save_entries(make_entry(owner_id, ticket, feed.TICKET) for owner_id in owner_ids)
+
+
+def push_review(review):
+    """
+    Adds a new review to the inbox of its author, their followers and the
+    author of the reviewed ticket.
+    """
+    ticket_user_id = Ticket.objects.values_list("user_id", flat=True).get(
+        id=review.ticket_id
+    )
+    owner_ids = {review.user_id, ticket_user_id, *follower_ids(review.user_id)}
+    save_entries(make_entry(owner_id, review, feed.REVIEW) for owner_id in owner_ids)
+
+
+def backfill_follow(user_follow):
+    """Adds the posts of a newly followed user to the follower's inbox."""
+    backfill_follows(user_follow.user_id, [user_follow.followed_user_id])
+
+
+def backfill_follows(owner_id, followed_ids):
+    """Adds the posts of several newly followed users to an inbox."""
+    tickets = Ticket.objects.filter(user_id__in=followed_ids).only("id", "time_created")
+    reviews = Review.objects.filter(user_id__in=followed_ids).only("id", "time_created")
+    save_entries(make_entry(owner_id, ticket, feed.TICKET) for ticket in tickets)
+    save_entries(make_entry(owner_id, review, feed.REVIEW) for review in reviews)
+
+
+def purge_follow(user_follow):
+    """
+    Removes the posts of an unfollowed user from the former follower's
+    inbox, except the reviews answering the follower's own tickets.
+    """
+    purge_follows(user_follow.user_id, [user_follow.followed_user_id])
+
+
+def purge_follows(owner_id, followed_ids):
+    """purge_follow for several unfollowed users."""
+    FeedEntry.objects.filter(owner_id=owner_id).filter(
+        Q(ticket__user_id__in=followed_ids)
+        | (Q(review__user_id__in=followed_ids) & ~Q(review__ticket__user_id=owner_id))
+    ).delete()
+
+
+@transaction.atomic
+def rebuild(users):
+    """Rebuilds from scratch the inbox of each user of `users`."""
+    for user in users:
+        FeedEntry.objects.filter(owner=user).delete()
+        tickets = user.get_viewable_tickets().only("id", "time_created")
+        reviews = user.get_viewable_reviews().only("id", "time_created")
+        save_entries(make_entry(user.id, ticket, feed.TICKET) for ticket in tickets)
+        save_entries(make_entry(user.id, review, feed.REVIEW) for review in reviews)
+
+
+def get_page(user, cursor=None, page_size=feed.DEFAULT_PAGE_SIZE):
+    """Returns a page of the materialized feed of `user`."""
+    entries = FeedEntry.objects.annotate(
+        author_id=Coalesce("ticket__user_id", "review__user_id")
+    ).filter(user.not_blocked("author_id"), owner=user)
+    if cursor is not None:
+        # The leading bound keeps the condition usable as an index range
+        entries = entries.filter(
+            Q(time_created__lt=cursor.time_created)
+            | Q(content_type__lt=cursor.content_type)
+            | Q(content_type=cursor.content_type, post_id__lt=cursor.id),
+            time_created__lte=cursor.time_created,
+        )
+    entries = entries.select_related(
+        "ticket__user", "review__user", "review__ticket__user"
+    )
+    entries = entries.order_by("-time_created", "-content_type", "-post_id")
+
+    posts = []
+    for entry in entries[: page_size + 1]:
+        if entry.content_type == feed.TICKET:
+            post = entry.ticket
+        else:
+            post = entry.review
+        post.content_type = entry.content_type
+        posts.append(post)
+
+    next_cursor = None
+    if len(posts) > page_size:
+        posts = posts[:page_size]
+        next_cursor = feed.Cursor.from_post(posts[-1])
+    return feed.FeedPage(posts=posts, next_cursor=next_cursor)
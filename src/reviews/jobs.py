@@ -0,0 +1,140 @@
+"""
+Background processing of uploaded ticket images.
+
+Every upload creates an ImageJob. Depending on the IMAGE_PROCESSING
+setting, the job is run:
+
+- ``thread``: by a thread pool of the web process, once the request
+  transaction is committed;
+- ``queue``: by the ``process_image_jobs`` worker command;
+- ``inline``: right away, inside the request.
+
+The jobs of a thread pool are lost when its process exits, and a job stays
+running if its worker is killed: ``process_image_jobs`` runs the former and
+requeues the latter (see `requeue_stale`), whatever the mode.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F
+from django.utils import timezone
+
+from reviews import images
+from reviews.models import ImageJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS, thread_name_prefix="image-job"
+        )
+    return _executor
+
+
+def enqueue(ticket):
+    """Creates the processing job of the image of `ticket`."""
+    job = ImageJob.objects.create(ticket=ticket)
+    mode = settings.IMAGE_PROCESSING
+    if mode == "inline":
+        run(job.id)
+    elif mode == "thread":
+        transaction.on_commit(lambda: get_executor().submit(run_in_thread, job.id))
+    return job
+
+
+def run_in_thread(job_id):
+    try:
+        run(job_id)
+    finally:
+        # Threads of the pool don't go through the request cycle
+        close_old_connections()
+
+
+def claim(job_id):
+    """Marks a pending job as running. Returns False if another worker has it."""
+    return bool(
+        ImageJob.objects.filter(id=job_id, status=ImageJob.PENDING).update(
+            status=ImageJob.RUNNING, time_started=timezone.now()
+        )
+    )
+
+
+def run(job_id):
+    """Runs a pending job. Returns False if it was already claimed."""
+    if not claim(job_id):
+        return False
+    job = ImageJob.objects.select_related("ticket").get(id=job_id)
+    ticket = job.ticket
+    try:
+        images.process_ticket_image(ticket)
+    except OSError as error:
+        # Missing file, or a file Pillow can't decode: drop the image
+        logger.warning("Image job %s failed: %s", job_id, error)
+        job.status, job.error = ImageJob.FAILED, str(error)
+        ticket.image = None
+        ticket.image_ready = True
+        ticket.save(update_fields=["image", "image_ready", "time_updated"])
+    except Exception as error:
+        # Anything else is a bug or a failing dependency: the image is kept
+        # and shown as uploaded rather than as a placeholder forever
+        logger.exception("Image job %s failed", job_id)
+        job.status, job.error = ImageJob.FAILED, repr(error)
+        ticket.image_ready = True
+        ticket.save(update_fields=["image_ready", "time_updated"])
+    else:
+        job.status = ImageJob.DONE
+    job.time_finished = timezone.now()
+    job.save(update_fields=["status", "error", "time_finished"])
+    return True
+
+
+def requeue_stale(timeout):
+    """
+    Puts back in the queue the jobs running for longer than `timeout`, whose
+    worker was stopped before finishing them. Returns their number.
+    """
+    return ImageJob.objects.filter(
+        status=ImageJob.RUNNING, time_started__lt=timezone.now() - timeout
+    ).update(status=ImageJob.PENDING, time_started=None)
+
+
+def run_pending(limit=None):
+    """Runs the pending jobs, oldest first. Returns the number of jobs run."""
+    job_ids = ImageJob.objects.filter(status=ImageJob.PENDING).order_by("time_created")
+    job_ids = job_ids.values_list("id", flat=True)[:limit]
+    return sum(run(job_id) for job_id in list(job_ids))
+
+
+def stats():
+    """Returns the queue depth and the mean latencies of finished jobs."""
+    counts = dict(
+        ImageJob.objects.values_list("status").annotate(n=Count("id")).order_by()
+    )
+    latencies = ImageJob.objects.filter(time_finished__isnull=False).aggregate(
+        wait=Avg(
+            ExpressionWrapper(
+                F("time_started") - F("time_created"), output_field=DurationField()
+            )
+        ),
+        total=Avg(
+            ExpressionWrapper(
+                F("time_finished") - F("time_created"), output_field=DurationField()
+            )
+        ),
+    )
+    return {
+        "pending": counts.get(ImageJob.PENDING, 0),
+        "running": counts.get(ImageJob.RUNNING, 0),
+        "done": counts.get(ImageJob.DONE, 0),
+        "failed": counts.get(ImageJob.FAILED, 0),
+        "mean_wait": latencies["wait"],
+        "mean_latency": latencies["total"],
+    }
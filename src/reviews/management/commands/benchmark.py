@@ -0,0 +1,218 @@
+import json
+import platform
+import random
+import statistics
+import tracemalloc
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from config.instrumentation import Recorder
+from reviews import feed_cache, scenarios, workloads
+from reviews.models import Review, Ticket, UserFollows
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main pages and the API through the test client: latency "
+        "percentiles, queries, SQL and render (template or JSON) time, response "
+        "size and peak memory per endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            choices=sorted(workloads.PROFILES),
+            default="smoke",
+            help="Workload seeded when the database has no post, or with --reseed",
+        )
+        parser.add_argument("--seed", type=int, default=42, help="Random seed")
+        parser.add_argument(
+            "--reseed",
+            action="store_true",
+            help="Replace the data of the database by the workload",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=50, help="Measured requests per endpoint"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=5, help="Unmeasured requests per endpoint"
+        )
+        parser.add_argument(
+            "--users", type=int, default=20, help="Number of users sending requests"
+        )
+        parser.add_argument(
+            "--endpoints", nargs="+", help="Only benchmark these endpoints"
+        )
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Clear the feed and card caches before every request",
+        )
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument(
+            "--compare", help="JSON results of a previous run to compare with"
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10,
+            help="Change (in %%) reported as a regression by --compare",
+        )
+
+    def seed(self, options):
+        if options["reseed"] or not Ticket.objects.exists():
+            self.stdout.write(f"Seeding the {options['profile']} workload...")
+            call_command(
+                "fake_data",
+                profile=options["profile"],
+                seed=options["seed"],
+                stdout=self.stdout,
+            )
+
+    def send(self, endpoint, user, options):
+        """Sends one request of `user`. Returns the response and its measures."""
+        if options["cold"]:
+            caches[feed_cache.CACHE_ALIAS].clear()
+            caches[feed_cache.FRAGMENT_CACHE_ALIAS].clear()
+        recorder = Recorder()
+        response, elapsed = scenarios.send(
+            self.clients[user.id], endpoint, user, recorder=recorder
+        )
+        return response, elapsed, recorder
+
+    def measure(self, endpoint, users, options):
+        for i in range(options["warmup"]):
+            self.send(endpoint, users[i % len(users)], options)
+
+        latencies, queries, sql_times, render_times = [], [], [], []
+        sizes, statuses = [], set()
+        for i in range(options["requests"]):
+            response, elapsed, recorder = self.send(
+                endpoint, users[i % len(users)], options
+            )
+            statuses.add(response.status_code)
+            latencies.append(elapsed * 1000)
+            queries.append(recorder.query_count)
+            sql_times.append(recorder.sql_time * 1000)
+            render_times.append(recorder.render_time * 1000)
+            sizes.append(len(response.content))
+
+        # tracemalloc slows every allocation down: memory has its own requests
+        tracemalloc.start()
+        peak = 0
+        for user in users[:3]:
+            tracemalloc.reset_peak()
+            self.send(endpoint, user, options)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        return {
+            "p50_ms": round(cuts[49], 2),
+            "p95_ms": round(cuts[94], 2),
+            "p99_ms": round(cuts[98], 2),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+            "queries": round(statistics.fmean(queries), 1),
+            "max_queries": max(queries),
+            "sql_ms": round(statistics.fmean(sql_times), 2),
+            "render_ms": round(statistics.fmean(render_times), 2),
+            "bytes": round(statistics.fmean(sizes)),
+            "peak_memory_kib": round(peak / 1024),
+            "statuses": sorted(statuses),
+        }
+
+    def handle(self, *args, **options):
+        if options["requests"] < 2:
+            raise CommandError("--requests must be at least 2")
+        self.seed(options)
+        rng = random.Random(options["seed"])
+        users = scenarios.get_users(rng, options["users"])
+        self.clients = scenarios.log_in(users)
+        endpoints = scenarios.select_endpoints(
+            scenarios.get_endpoints(rng), options["endpoints"]
+        )
+
+        results = {
+            "meta": {
+                "profile": options["profile"],
+                "seed": options["seed"],
+                "requests": options["requests"],
+                "users": len(users),
+                "cold": options["cold"],
+                "database": connection.vendor,
+                "django": django.get_version(),
+                "python": platform.python_version(),
+                "dataset": {
+                    "users": User.objects.count(),
+                    "tickets": Ticket.objects.count(),
+                    "reviews": Review.objects.count(),
+                    "follows": UserFollows.objects.count(),
+                },
+            },
+            "endpoints": {},
+        }
+        for endpoint in endpoints:
+            self.stdout.write(f"Benchmarking {endpoint.name}...")
+            results["endpoints"][endpoint.name] = self.measure(endpoint, users, options)
+
+        self.show(results)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+                output.write("\n")
+            self.stdout.write(f"Results written to {options['output']}")
+        if options["compare"]:
+            with open(options["compare"]) as baseline:
+                self.compare(json.load(baseline), results, options["threshold"])
+
+    def show(self, results):
+        self.stdout.write(
+            f"\n{'endpoint':<26}{'p50':>8}{'p95':>8}{'p99':>8}"
+            f"{'queries':>9}{'sql':>8}{'render':>8}{'bytes':>9}{'peak KiB':>10}"
+        )
+        for name, r in results["endpoints"].items():
+            self.stdout.write(
+                f"{name:<26}{r['p50_ms']:>8.1f}{r['p95_ms']:>8.1f}{r['p99_ms']:>8.1f}"
+                f"{r['queries']:>9.1f}{r['sql_ms']:>8.1f}{r['render_ms']:>8.1f}"
+                f"{r['bytes']:>9}{r['peak_memory_kib']:>10}"
+            )
+            if any(status >= 400 for status in r["statuses"]):
+                self.stdout.write(
+                    self.style.WARNING(f"  {name} answered {r['statuses']}")
+                )
+
+    def compare(self, baseline, results, threshold):
+        """Prints the changes since `baseline` and flags the regressions."""
+        for key in ("dataset", "database", "cold"):
+            if baseline["meta"][key] != results["meta"][key]:
+                self.stdout.write(
+                    self.style.WARNING(f"The baseline has another {key} setting")
+                )
+        self.stdout.write(f"\nChanges since the baseline (threshold {threshold}%):")
+        regressions = 0
+        for name, result in results["endpoints"].items():
+            before = baseline["endpoints"].get(name)
+            if before is None:
+                continue
+            for metric in ("p50_ms", "p95_ms", "queries", "bytes", "peak_memory_kib"):
+                if metric not in before:
+                    continue
+                old, new = before[metric], result[metric]
+                change = (new - old) / old * 100 if old else 0
+                line = f"  {name} {metric}: {old} -> {new} ({change:+.1f}%)"
+                if change > threshold:
+                    regressions += 1
+                    self.stdout.write(self.style.WARNING(line))
+                elif change < -threshold:
+                    self.stdout.write(self.style.SUCCESS(line))
+        if regressions:
+            self.stdout.write(self.style.WARNING(f"{regressions} regression(s)"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No regression"))
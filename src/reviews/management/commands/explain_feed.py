@@ -0,0 +1,98 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from reviews import feed
+
+User = get_user_model()
+
+POST_TABLES = ("reviews_ticket", "reviews_review")
+
+
+def is_full_scan(line):
+    """SQLite SCAN of a posts table, or PostgreSQL Seq Scan node."""
+    return ("SCAN" in line and any(t in line for t in POST_TABLES)) or (
+        "Seq Scan" in line
+    )
+
+
+def is_sort(line):
+    """SQLite temporary sort, or PostgreSQL Sort node (not its Sort Key)."""
+    node = line.strip().removeprefix("->").strip()
+    return "USE TEMP B-TREE" in line or node.startswith(
+        ("Sort  (", "Incremental Sort  (")
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the query plans and timings of the home feed queries, and flag "
+        "full scans and sorts of the posts tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username",
+            help="Feed owner (defaults to the user following the most users)",
+        )
+        parser.add_argument(
+            "--pages", type=int, default=5, help="Number of pages to walk"
+        )
+        parser.add_argument(
+            "--page-size", type=int, default=feed.DEFAULT_PAGE_SIZE, help="Page size"
+        )
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get_by_natural_key(username)
+            except User.DoesNotExist:
+                raise CommandError(f"User {username} does not exist")
+        user = User.objects.annotate(n=Count("following")).order_by("-n").first()
+        if user is None:
+            raise CommandError("The database has no user")
+        return user
+
+    def handle(self, *args, **options):
+        user = self.get_user(options["username"])
+        page_size = options["page_size"]
+        self.stdout.write(
+            f"Feed of {user.username} "
+            f"({user.following.count()} follows, page size {page_size})\n"
+        )
+
+        full_scans = sorts = 0
+        for content_type, queryset in feed.home_streams(user):
+            query = feed.ordered_stream(queryset, content_type, None, page_size + 1)
+            plan = query.explain()
+            self.stdout.write(f"{content_type} stream:\n{plan}\n")
+            for line in plan.splitlines():
+                if is_full_scan(line):
+                    full_scans += 1
+                    self.stdout.write(self.style.WARNING(f"  full scan: {line}"))
+                elif is_sort(line):
+                    sorts += 1
+                    self.stdout.write(self.style.WARNING(f"  sort: {line}"))
+
+        cursor = None
+        for number in range(1, options["pages"] + 1):
+            start = time.perf_counter()
+            page = feed.get_page(feed.home_streams(user), cursor, page_size)
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stdout.write(
+                f"Page {number}: {len(page.posts)} posts in {elapsed:.1f} ms"
+            )
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        if full_scans or sorts:
+            self.stdout.write(
+                self.style.WARNING(f"{full_scans} full scan(s), {sorts} sort(s) found")
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS("Every feed query reads an index in feed order")
+            )
@@ -1,14 +1,88 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
 from django.core.files.base import ContentFile
-from reviews.models import Ticket, Review, UserFollows, UserBlocked
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from authentication.models import username_key
+from reviews import counters, images, inbox, search, workloads
+from reviews.models import (
+    FeedEntry,
+    ImageJob,
+    Ticket,
+    Review,
+    UserFollows,
+    UserBlocked,
+)
+from concurrent.futures import ProcessPoolExecutor
 from faker import Faker
+from itertools import islice
+import os
 import random
 import requests
+import time
 
 User = get_user_model()
 
 
+def new_user(username, email, password):
+    # bulk_create n'appelle pas User.save(), qui remplit username_key
+    return User(
+        username=username,
+        username_key=username_key(username),
+        email=email,
+        password=password,
+    )
+
+
+class Progress:
+    """Prints the number of rows written and the write rate."""
+
+    def __init__(self, stdout, label, total):
+        self.stdout = stdout
+        self.label = label
+        self.total = total
+        self.count = self.reported = 0
+        self.start = self.last_report = time.perf_counter()
+
+    def add(self, rows):
+        self.count += rows
+        now = time.perf_counter()
+        if now - self.last_report >= 1 or self.count >= self.total:
+            self.report(now)
+
+    def finish(self):
+        """Prints the final count, when fewer rows than expected were written."""
+        if self.reported != self.count:
+            self.report(time.perf_counter())
+
+    def report(self, now):
+        self.last_report, self.reported = now, self.count
+        rate = self.count / max(now - self.start, 1e-6)
+        self.stdout.write(
+            f"  {self.label}: {self.count}/{self.total} ({rate:,.0f} rows/s)"
+        )
+
+
+class TextPool:
+    """Pre-generated Faker texts, sampled instead of calling Faker per row."""
+
+    def __init__(self, fake, size=1000, rng=random):
+        self.titles = [fake.catch_phrase()[:128] for _ in range(size)]
+        self.headlines = [
+            fake.sentence(nb_words=rng.randint(4, 10))[:128] for _ in range(size)
+        ]
+        self.descriptions = [
+            fake.paragraph(nb_sentences=rng.randint(3, 8))[:2048] for _ in range(size)
+        ]
+        self.bodies = [
+            fake.paragraph(nb_sentences=rng.randint(5, 15))[:8192] for _ in range(size)
+        ]
+        self.usernames = [fake.user_name() for _ in range(size)]
+
+
 class Command(BaseCommand):
     help = "Populate database with test data for tickets, reviews, follows and blocks"
 
@@ -25,6 +99,37 @@ class Command(BaseCommand):
         parser.add_argument(
             "--with-images", action="store_true", help="Add images to tickets (slower)"
         )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="High-volume mode: batched bulk inserts and locally generated images",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows per bulk insert and transaction (--bulk)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Processes rendering the images (--bulk)",
+        )
+        parser.add_argument(
+            "--profile",
+            choices=sorted(workloads.PROFILES),
+            help="Named, reproducible workload (implies --bulk, ignores the counts): "
+            + "; ".join(
+                f"{p.name}: {p.description}" for p in workloads.PROFILES.values()
+            ),
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=42,
+            help="Random seed of the workload (--profile)",
+        )
 
     def get_random_image(self):
         """Télécharge une image aléatoire depuis Lorem Picsum"""
@@ -43,6 +148,13 @@ class Command(BaseCommand):
         return None
 
     def handle(self, *args, **options):
+        if options["profile"]:
+            self.handle_profile(options)
+            return
+        if options["bulk"]:
+            self.handle_bulk(options)
+            return
+
         fake = Faker("fr_FR")
 
         self.stdout.write("Clearing existing data...")
@@ -215,14 +327,321 @@ class Command(BaseCommand):
             )
         )
 
-        # Afficher quelques stats intéressantes
-        user_with_most_tickets = max(all_users, key=lambda u: u.tickets.count())
-        user_with_most_reviews = max(all_users, key=lambda u: u.reviews.count())
-        user_with_most_follows = max(all_users, key=lambda u: u.following.count())
+        self.show_fun_stats()
+
+    def show_fun_stats(self):
+        """Affiche quelques stats intéressantes (compteurs dénormalisés)"""
+        stats = {}
+        for label, counter in (
+            ("Most tickets", "ticket_count"),
+            ("Most reviews", "review_count"),
+            ("Most follows", "following_count"),
+            ("Most followers", "follower_count"),
+        ):
+            user = User.objects.order_by(f"-{counter}").first()
+            stats[label] = (
+                f"{user.username} ({getattr(user, counter)})" if user else "-"
+            )
 
         self.stdout.write(
-            f"📊 Fun stats:\n"
-            f"   Most tickets: {user_with_most_tickets.username} ({user_with_most_tickets.tickets.count()})\n"
-            f"   Most reviews: {user_with_most_reviews.username} ({user_with_most_reviews.reviews.count()})\n"
-            f"   Most follows: {user_with_most_follows.username} ({user_with_most_follows.following.count()})\n"
+            "📊 Fun stats:\n"
+            + "".join(f"   {label}: {value}\n" for label, value in stats.items())
         )
+
+    # Mode --bulk
+
+    def bulk_insert(self, model, rows, options, label, total, ignore_conflicts=False):
+        """
+        Écrit `rows` (instances non sauvegardées) par lots avec bulk_create,
+        une transaction par lot. Retourne les ids créés.
+        """
+        progress = Progress(self.stdout, label, total)
+        ids = []
+        rows = iter(rows)
+        while batch := list(islice(rows, options["batch_size"])):
+            with transaction.atomic():
+                created = model.objects.bulk_create(
+                    batch, ignore_conflicts=ignore_conflicts
+                )
+            if not ignore_conflicts:
+                ids.extend(obj.pk for obj in created)
+            progress.add(len(batch))
+        return ids
+
+    def render_images(self, executor, count, rng=random):
+        """Génère `count` images localement dans le pool de processus"""
+        sizes = [(rng.randint(400, 800), rng.randint(300, 600)) for _ in range(count)]
+        seeds = [rng.getrandbits(32) for _ in range(count)]
+        rendered = executor.map(
+            images.render_placeholder,
+            seeds,
+            [width for width, _ in sizes],
+            [height for _, height in sizes],
+            chunksize=16,
+        )
+        return [
+            default_storage.save(f"ticket_{seed}.jpg", ContentFile(data))
+            for seed, data in zip(seeds, rendered)
+        ]
+
+    def generate_tickets(self, texts, owners, options, executor):
+        """Tickets des users `owners`, images générées lot par lot"""
+        owners = iter(owners)
+        while batch := list(islice(owners, options["batch_size"])):
+            # 60% des tickets ont une image si l'option est activée
+            with_image = [
+                options["with_images"] and random.random() < 0.6 for _ in batch
+            ]
+            names = iter(self.render_images(executor, sum(with_image)))
+            for user_id, has_image in zip(batch, with_image):
+                yield Ticket(
+                    title=random.choice(texts.titles),
+                    description=random.choice(texts.descriptions),
+                    user_id=user_id,
+                    image=next(names) if has_image else None,
+                )
+
+    def make_review(self, texts, ticket_id, user_id):
+        return Review(
+            ticket_id=ticket_id,
+            rating=random.randint(0, 5),
+            headline=random.choice(texts.headlines),
+            body=random.choice(texts.bodies),
+            user_id=user_id,
+        )
+
+    def clear_bulk(self):
+        self.stdout.write("Clearing existing data...")
+        # Suppression directe, sans le collecteur de Django ni ses signaux
+        with connection.cursor() as cursor:
+            for model in (FeedEntry, ImageJob, Review, Ticket, UserFollows, UserBlocked):
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(f"DELETE FROM {table}")
+        User.objects.all().delete()
+
+    def create_admins(self):
+        self.stdout.write("Creating admin users...")
+        return [
+            User.objects.create_superuser(
+                username=username, email=f"{username}@example.com", password="admin123"
+            )
+            for username in ("admin", "superadmin")
+        ]
+
+    def finish_bulk(self, start):
+        # bulk_create n'envoie pas de signaux : compteurs, index de
+        # recherche, flux et caches sont refaits
+        self.stdout.write("Counting...")
+        counters.recount()
+        self.stdout.write("Indexing...")
+        search.rebuild()
+        if inbox.is_enabled():
+            call_command("rebuild_feed", stdout=self.stdout)
+        caches["feed"].clear()
+        caches["template_fragments"].clear()
+
+        elapsed = time.perf_counter() - start
+        rows = sum(
+            model.objects.count()
+            for model in (User, UserFollows, UserBlocked, Ticket, Review)
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\n✅ {rows} rows written in {elapsed:.1f} s "
+                f"({rows / elapsed:,.0f} rows/s)\n"
+                f"   Users: {User.objects.count()} | Tickets: {Ticket.objects.count()}"
+                f" | Reviews: {Review.objects.count()}\n"
+                f"   Follows: {UserFollows.objects.count()}"
+                f" | Blocks: {UserBlocked.objects.count()}\n"
+                f"🔑 admin / admin123, regular users: password123\n"
+                f"💡 Thumbnails: python manage.py process_images"
+            )
+        )
+        self.show_fun_stats()
+
+    def handle_bulk(self, options):
+        fake = Faker("fr_FR")
+        texts = TextPool(fake)
+        start = time.perf_counter()
+
+        self.clear_bulk()
+        admins = self.create_admins()
+
+        # Un seul hash de mot de passe, partagé par tous les users
+        password = make_password("password123")
+        user_ids = [admin.id for admin in admins] + self.bulk_insert(
+            User,
+            (
+                new_user(
+                    f"{random.choice(texts.usernames)}{i}",
+                    f"user{i}@example.com",
+                    password,
+                )
+                for i in range(options["users"])
+            ),
+            options,
+            "Users",
+            options["users"],
+        )
+
+        def follows():
+            # Chaque user suit entre 1 et 7 autres users
+            for user_id in user_ids:
+                k = random.randint(1, min(7, len(user_ids) - 1))
+                followed_ids = random.sample(user_ids, k + 1)
+                for followed_id in [f for f in followed_ids if f != user_id][:k]:
+                    yield UserFollows(user_id=user_id, followed_user_id=followed_id)
+
+        self.bulk_insert(
+            UserFollows, follows(), options, "Follows", len(user_ids) * 4, True
+        )
+
+        def blocks():
+            # Environ 10% des users bloquent 1 à 3 personnes
+            for user_id in random.sample(user_ids, k=max(1, len(user_ids) // 10)):
+                k = random.randint(1, min(3, len(user_ids) - 1))
+                blocked_ids = random.sample(user_ids, k + 1)
+                for blocked_id in [b for b in blocked_ids if b != user_id][:k]:
+                    yield UserBlocked(user_id=user_id, blocked_user_id=blocked_id)
+
+        self.bulk_insert(
+            UserBlocked, blocks(), options, "Blocks", len(user_ids) // 5, True
+        )
+
+        with ProcessPoolExecutor(max_workers=max(1, options["workers"])) as executor:
+            ticket_users = [random.choice(user_ids) for _ in range(options["tickets"])]
+            ticket_ids = self.bulk_insert(
+                Ticket,
+                self.generate_tickets(texts, ticket_users, options, executor),
+                options,
+                "Tickets",
+                options["tickets"],
+            )
+
+            # 70% des reviews répondent à des tickets existants, sans doublon
+            # (ticket, reviewer) ni review de son propre ticket
+            num_reviews_with_tickets = int(options["reviews"] * 0.7)
+            seen = set()
+
+            def reviews():
+                for _ in range(num_reviews_with_tickets if ticket_ids else 0):
+                    index = random.randrange(len(ticket_ids))
+                    reviewer = random.choice(user_ids)
+                    pair = (ticket_ids[index], reviewer)
+                    if reviewer != ticket_users[index] and pair not in seen:
+                        seen.add(pair)
+                        yield self.make_review(texts, *pair)
+
+            self.bulk_insert(
+                Review, reviews(), options, "Reviews", num_reviews_with_tickets
+            )
+
+            # 30% des reviews sont créées avec leur propre ticket
+            num_combos = options["reviews"] - num_reviews_with_tickets
+            combo_users = [random.choice(user_ids) for _ in range(num_combos)]
+            combo_ticket_ids = self.bulk_insert(
+                Ticket,
+                self.generate_tickets(texts, combo_users, options, executor),
+                options,
+                "Ticket+review tickets",
+                num_combos,
+            )
+        self.bulk_insert(
+            Review,
+            (
+                self.make_review(texts, ticket_id, user_id)
+                for ticket_id, user_id in zip(combo_ticket_ids, combo_users)
+            ),
+            options,
+            "Ticket+review reviews",
+            num_combos,
+        )
+
+        self.finish_bulk(start)
+
+    # Mode --profile
+
+    def handle_profile(self, options):
+        profile = workloads.PROFILES[options["profile"]]
+        # Un seul générateur, initialisé avec la graine : mêmes profil et
+        # graine, mêmes données
+        rng = random.Random(options["seed"])
+        fake = Faker("fr_FR")
+        fake.seed_instance(options["seed"])
+        texts = TextPool(fake, rng=rng)
+        start = time.perf_counter()
+        self.stdout.write(
+            f"Profile {profile.name} (seed {options['seed']}): {profile.users} users,"
+            f" {profile.tickets} tickets, ~{profile.reviews} reviews"
+        )
+
+        self.clear_bulk()
+        admins = self.create_admins()
+
+        password = make_password("password123")
+        # Les premiers users sont les plus suivis et les plus actifs
+        user_ids = self.bulk_insert(
+            User,
+            (
+                new_user(
+                    f"{rng.choice(texts.usernames)}{i}",
+                    f"user{i}@example.com",
+                    password,
+                )
+                for i in range(profile.users)
+            ),
+            options,
+            "Users",
+            profile.users,
+        ) + [admin.id for admin in admins]
+
+        self.bulk_insert(
+            UserFollows,
+            workloads.generate_follows(profile, rng, user_ids),
+            options,
+            "Follows",
+            len(user_ids) * profile.mean_follows,
+            True,
+        )
+        self.bulk_insert(
+            UserBlocked,
+            workloads.generate_blocks(profile, rng, user_ids),
+            options,
+            "Blocks",
+            round(len(user_ids) * profile.block_ratio * 2),
+            True,
+        )
+
+        # Tickets puis leurs reviews, lot par lot : la mémoire ne dépend
+        # que de --batch-size
+        timeline = workloads.Timeline(rng, profile.months, profile.burstiness)
+        tickets = workloads.generate_tickets(
+            profile, rng, user_ids, texts, timeline, profile.tickets
+        )
+        ticket_progress = Progress(self.stdout, "Tickets", profile.tickets)
+        review_progress = Progress(self.stdout, "Reviews", profile.reviews)
+        with (
+            ProcessPoolExecutor(max_workers=max(1, options["workers"])) as executor,
+            workloads.explicit_timestamps(Ticket, Review),
+        ):
+            while batch := list(islice(tickets, options["batch_size"])):
+                if options["with_images"]:
+                    # 60% des tickets ont une image
+                    with_image = [t for t in batch if rng.random() < 0.6]
+                    names = self.render_images(executor, len(with_image), rng)
+                    for ticket, name in zip(with_image, names):
+                        ticket.image = name
+                with transaction.atomic():
+                    Ticket.objects.bulk_create(batch)
+                    reviews = list(
+                        workloads.generate_reviews(profile, rng, user_ids, texts, batch)
+                    )
+                    Review.objects.bulk_create(
+                        reviews, batch_size=options["batch_size"]
+                    )
+                ticket_progress.add(len(batch))
+                review_progress.add(len(reviews))
+        # Le nombre de reviews n'est connu qu'une fois généré
+        review_progress.finish()
+
+        self.finish_bulk(start)
@@ -0,0 +1,32 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from reviews import feed_cache
+
+
+class Command(BaseCommand):
+    help = "Show the hit/miss counters of the feed page cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clear", action="store_true", help="Empty the feed cache afterwards"
+        )
+
+    def handle(self, *args, **options):
+        if isinstance(feed_cache.get_cache(), LocMemCache):
+            self.stdout.write(
+                self.style.WARNING(
+                    "The feed cache is in the memory of each process: "
+                    "the counters of the web workers can't be read from here"
+                )
+            )
+        stats = feed_cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / lookups if lookups else 0
+        self.stdout.write(
+            f"Feed cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({ratio:.0%} hit ratio)"
+        )
+        if options["clear"]:
+            feed_cache.get_cache().clear()
+            self.stdout.write(self.style.SUCCESS("Feed cache cleared"))
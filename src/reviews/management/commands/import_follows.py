@@ -0,0 +1,60 @@
+import csv
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews import follows
+
+User = get_user_model()
+
+
+def read_usernames(rows):
+    """Yields the first column of the CSV rows, without a "username" header."""
+    for index, row in enumerate(rows):
+        if not row or not row[0].strip():
+            continue
+        username = row[0].strip()
+        if index == 0 and username.lower() == "username":
+            continue
+        yield username
+
+
+class Command(BaseCommand):
+    help = (
+        "Make a user follow, or unfollow, the users listed in the first column "
+        "of a CSV file, in batches with one write and one feed invalidation each"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_file", help="CSV file, one username per row")
+        parser.add_argument("--user", required=True, help="Username of the follower")
+        parser.add_argument(
+            "--unfollow", action="store_true", help="Unfollow the listed users"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user: {options['user']}")
+
+        result = follows.BatchResult()
+        with open(options["csv_file"], newline="", encoding="utf-8") as csv_file:
+            usernames = read_usernames(csv.reader(csv_file))
+            while batch := list(islice(usernames, follows.BATCH_SIZE)):
+                result.update(
+                    follows.follow_many(user, batch, unfollow=options["unfollow"])
+                )
+                self.stdout.write(f"  {len(result.changed)} follows changed...")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(result.changed)} changed, {len(result.unchanged)} unchanged, "
+                f"{len(result.unknown)} unknown"
+            )
+        )
+        if result.unknown:
+            self.stdout.write(
+                self.style.WARNING(f"Unknown users: {', '.join(result.unknown[:20])}")
+            )
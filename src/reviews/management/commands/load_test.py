@@ -0,0 +1,275 @@
+import asyncio
+import json
+import multiprocessing
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.test import AsyncClient, Client
+
+from reviews import scenarios
+
+DEFAULT_MIX = "home=4,home-page-2=1,ticket-detail=3,ticket-create=1,review-create=1"
+
+
+def parse_mix(mix):
+    try:
+        weights = {
+            name.strip(): int(weight)
+            for name, weight in (item.split("=") for item in mix.split(","))
+        }
+    except ValueError:
+        raise CommandError(f"Invalid mix: {mix}")
+    return weights
+
+
+class Session:
+    """
+    A simulated client, sending its requests one after the other with the
+    test clients of a few logged-in users.
+    """
+
+    def __init__(self, seed, options, weights, client_class):
+        self.rng = random.Random(seed)
+        self.users = scenarios.get_users(self.rng, options["users"])
+        # Failed requests are counted instead of stopping the session
+        self.clients = scenarios.log_in(
+            self.users, client_class, raise_request_exception=False
+        )
+        self.endpoints = scenarios.select_endpoints(
+            scenarios.get_endpoints(self.rng), weights
+        )
+        self.weights = [weights[endpoint.name] for endpoint in self.endpoints]
+        self.latencies, self.errors = defaultdict(list), Counter()
+
+    def pick(self):
+        return self.rng.choices(self.endpoints, self.weights)[0], self.rng.choice(
+            self.users
+        )
+
+    def record(self, endpoint, response, elapsed):
+        if response.status_code >= 500:
+            error = response.exc_info[1] if response.exc_info else None
+            self.errors[f"{type(error).__name__}: {error}"] += 1
+        else:
+            self.latencies[endpoint.name].append(elapsed * 1000)
+
+    def run(self, deadline):
+        while time.perf_counter() < deadline:
+            endpoint, user = self.pick()
+            try:
+                response, elapsed = scenarios.send(
+                    self.clients[user.id], endpoint, user, rollback=False
+                )
+            except DatabaseError as error:
+                self.errors[f"{type(error).__name__}: {error}"] += 1
+            else:
+                self.record(endpoint, response, elapsed)
+        # Each thread has its own connections
+        connections.close_all()
+
+    async def arun(self, deadline):
+        while time.perf_counter() < deadline:
+            endpoint, user = self.pick()
+            try:
+                response, elapsed = await scenarios.asend(
+                    self.clients[user.id], endpoint, user
+                )
+            except DatabaseError as error:
+                self.errors[f"{type(error).__name__}: {error}"] += 1
+            else:
+                self.record(endpoint, response, elapsed)
+
+
+def run_worker(number, options, weights, start, results):
+    """
+    Runs --concurrency sessions in one process until the end of the run,
+    in threads (wsgi) or tasks (asgi), and puts their latencies per
+    endpoint and their errors in the `results` queue.
+    """
+    asgi = options["interface"] == "asgi"
+    sessions = [
+        Session(
+            options["seed"] + number * options["concurrency"] + index,
+            options,
+            weights,
+            AsyncClient if asgi else Client,
+        )
+        for index in range(options["concurrency"])
+    ]
+    connections.close_all()
+    start.wait()
+    deadline = time.perf_counter() + options["duration"]
+    if asgi:
+
+        async def run_sessions():
+            await asyncio.gather(*(session.arun(deadline) for session in sessions))
+
+        asyncio.run(run_sessions())
+    else:
+        threads = [
+            threading.Thread(target=session.run, args=(deadline,))
+            for session in sessions
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    latencies, errors = defaultdict(list), Counter()
+    for session in sessions:
+        for name, values in session.latencies.items():
+            latencies[name].extend(values)
+        errors.update(session.errors)
+    results.put((dict(latencies), errors))
+
+
+class Command(BaseCommand):
+    help = (
+        "Send a mix of reads and writes from several processes at once, through "
+        "the WSGI or ASGI handler, and report the throughput, latencies and "
+        "errors (such as 'database is locked'). Writes are committed: the "
+        "database grows a little."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=4, help="Concurrent processes"
+        )
+        parser.add_argument(
+            "--interface",
+            choices=("wsgi", "asgi"),
+            default="wsgi",
+            help="Handler the requests go through: the WSGI one, or the ASGI "
+            "one from an event loop, as under an ASGI server",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Requests in flight per worker: threads (wsgi) or tasks (asgi)",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Length of the run (s)"
+        )
+        parser.add_argument(
+            "--mix",
+            default=DEFAULT_MIX,
+            help=f"Endpoints and their weights (default: {DEFAULT_MIX})",
+        )
+        parser.add_argument("--users", type=int, default=20, help="Users per worker")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed")
+        parser.add_argument("--output", help="Write the results to this JSON file")
+
+    def get_database_meta(self):
+        meta = {
+            "vendor": connection.vendor,
+            "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+            "aliases": sorted(settings.DATABASES),
+        }
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                meta["journal_mode"] = cursor.fetchone()[0]
+            meta["transaction_mode"] = connection.transaction_mode
+        return meta
+
+    def handle(self, *args, **options):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise CommandError("load_test needs the fork start method")
+        weights = parse_mix(options["mix"])
+        meta = {
+            "interface": options["interface"],
+            "concurrency": options["concurrency"],
+            "workers": options["workers"],
+            "duration": options["duration"],
+            "mix": weights,
+            "database": self.get_database_meta(),
+        }
+
+        # Each process has to open its own connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        start = context.Barrier(options["workers"] + 1)
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=run_worker, args=(number, options, weights, start, results)
+            )
+            for number in range(options["workers"])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(
+            f"{options['workers']} workers logging in, then sending requests "
+            f"for {options['duration']} s..."
+        )
+        start.wait()
+        began = time.perf_counter()
+        latencies, errors = defaultdict(list), Counter()
+        for _ in workers:
+            worker_latencies, worker_errors = results.get()
+            for name, values in worker_latencies.items():
+                latencies[name].extend(values)
+            errors.update(worker_errors)
+        elapsed = time.perf_counter() - began
+        for worker in workers:
+            worker.join()
+
+        ok = sum(len(values) for values in latencies.values())
+        failed = sum(errors.values())
+        report = {
+            "meta": meta,
+            "requests": ok + failed,
+            "errors": failed,
+            "throughput_rps": round(ok / elapsed, 1),
+            "error_kinds": dict(errors.most_common()),
+            "endpoints": {
+                name: self.summarize(values)
+                for name, values in sorted(latencies.items())
+            },
+        }
+        self.show(report)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+                output.write("\n")
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def summarize(self, values):
+        if len(values) < 2:
+            return {"count": len(values)}
+        cuts = statistics.quantiles(values, n=100, method="inclusive")
+        return {
+            "count": len(values),
+            "p50_ms": round(cuts[49], 2),
+            "p95_ms": round(cuts[94], 2),
+            "p99_ms": round(cuts[98], 2),
+        }
+
+    def show(self, report):
+        database = report["meta"]["database"]
+        self.stdout.write(
+            f"\nInterface: {report['meta']['interface']}, "
+            f"{report['meta']['workers']} workers x "
+            f"{report['meta']['concurrency']} in flight\n"
+            f"Database: {database}\n"
+            f"{report['requests']} requests, {report['throughput_rps']} req/s, "
+            f"{report['errors']} errors"
+        )
+        self.stdout.write(f"{'endpoint':<26}{'count':>8}{'p50':>8}{'p95':>8}{'p99':>8}")
+        for name, summary in report["endpoints"].items():
+            self.stdout.write(
+                f"{name:<26}{summary['count']:>8}"
+                + "".join(
+                    f"{summary.get(key, 0):>8.1f}"
+                    for key in ("p50_ms", "p95_ms", "p99_ms")
+                )
+            )
+        for kind, count in report["error_kinds"].items():
+            self.stdout.write(self.style.WARNING(f"  {count} x {kind}"))
@@ -0,0 +1,62 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from reviews import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the pending ticket image jobs (worker of IMAGE_PROCESSING=queue), "
+        "and requeue the stalled ones"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once the queue is empty"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=float,
+            default=600.0,
+            help="Seconds after which a running job is requeued",
+        )
+        parser.add_argument(
+            "--stats", action="store_true", help="Only show the queue statistics"
+        )
+
+    def show_stats(self):
+        stats = jobs.stats()
+        self.stdout.write(
+            f"Image jobs: {stats['pending']} pending, {stats['running']} running, "
+            f"{stats['done']} done, {stats['failed']} failed\n"
+            f"Mean wait: {stats['mean_wait']} | "
+            f"mean latency: {stats['mean_latency']}"
+        )
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.show_stats()
+            return
+
+        stale_after = timedelta(seconds=options["stale_after"])
+        self.stdout.write("Waiting for image jobs...")
+        while True:
+            requeued = jobs.requeue_stale(stale_after)
+            if requeued:
+                self.stdout.write(self.style.WARNING(f"  Requeued {requeued} jobs"))
+            processed = jobs.run_pending(limit=100)
+            if processed:
+                self.stdout.write(f"  Ran {processed} jobs")
+            elif options["once"]:
+                break
+            else:
+                time.sleep(options["interval"])
+        self.show_stats()
@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from reviews import images
+from reviews.models import Ticket
+
+
+class Command(BaseCommand):
+    help = (
+        "Sanitize existing ticket images and render their thumbnails, "
+        "in parallel worker processes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Also process the images which already have thumbnails",
+        )
+
+    def handle(self, *args, **options):
+        tickets = Ticket.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["force"]:
+            tickets = tickets.filter(image_variants={})
+        tickets = list(tickets.order_by("id"))
+        workers = max(1, options["workers"])
+        self.stdout.write(f"Processing {len(tickets)} images with {workers} workers...")
+
+        processed = failed = 0
+        # Bounded batches keep only a few images in memory at a time
+        batch_size = workers * 4
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for start in range(0, len(tickets), batch_size):
+                batch = []
+                for ticket in tickets[start : start + batch_size]:
+                    try:
+                        data = images.read_image(ticket)
+                    except OSError as error:
+                        failed += 1
+                        self.stdout.write(
+                            self.style.WARNING(f"  {ticket.image.name}: {error}")
+                        )
+                        continue
+                    batch.append((ticket, executor.submit(images.process_file, data)))
+
+                for ticket, future in batch:
+                    try:
+                        sanitized, variants = future.result()
+                    except OSError as error:
+                        failed += 1
+                        self.stdout.write(
+                            self.style.WARNING(f"  {ticket.image.name}: {error}")
+                        )
+                        continue
+                    images.store_processed(ticket, sanitized, variants)
+                    processed += 1
+                self.stdout.write(f"  Processed {processed}/{len(tickets)} images...")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{processed} images processed, {failed} failed")
+        )
@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from reviews import inbox
+from reviews.models import FeedEntry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized feed (FeedEntry) of every user from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", nargs="*", help="Only rebuild the feed of these usernames"
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("id")
+        if options["users"]:
+            users = users.filter(username__in=options["users"])
+        else:
+            FeedEntry.objects.all().delete()
+
+        total = users.count()
+        for i, user in enumerate(users.iterator(), start=1):
+            inbox.rebuild([user])
+            if i % 100 == 0:
+                self.stdout.write(f"  Rebuilt {i}/{total} feeds...")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {total} feeds ({FeedEntry.objects.count()} entries)"
+            )
+        )
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews import search
+from reviews.models import Review, Ticket
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text search index of the tickets and reviews from "
+        "scratch, after writes that bypassed the signals"
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        search.rebuild()
+        documents = Ticket.objects.count() + Review.objects.count()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {documents} posts in {time.perf_counter() - start:.1f} s"
+            )
+        )
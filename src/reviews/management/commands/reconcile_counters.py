@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from reviews import counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the denormalized counters of tickets and users with the tables "
+        "and repair the ones that drifted"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report the drift"
+        )
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile(dry_run=options["dry_run"])
+        for counter, rows in drift.items():
+            line = f"{counter}: {rows} wrong rows"
+            self.stdout.write(self.style.WARNING(line) if rows else line)
+        if not any(drift.values()):
+            self.stdout.write(self.style.SUCCESS("All counters are right"))
+        elif not options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS("Counters repaired"))
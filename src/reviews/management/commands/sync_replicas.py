@@ -0,0 +1,36 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary database to the SQLite replicas, to try the "
+        "replica routing locally with files standing in for real replicas"
+    )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replica: set DATABASE_REPLICA_URLS")
+        primary = connections["default"].settings_dict
+        if primary["ENGINE"] != "django.db.backends.sqlite3":
+            raise CommandError("Only SQLite databases can be copied")
+
+        source = sqlite3.connect(primary["NAME"])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                replica = connections[alias]
+                if replica.vendor != "sqlite":
+                    raise CommandError(f"{alias} is not an SQLite database")
+                replica.close()
+                # Online backup: consistent even while the primary is written
+                target = sqlite3.connect(replica.settings_dict["NAME"])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"{primary['NAME']} copied to {alias}")
+        finally:
+            source.close()
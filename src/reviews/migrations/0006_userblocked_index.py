@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reviews", "0005_feed_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userblocked",
+            index=models.Index(
+                fields=["blocked_user", "user"], name="userblocked_blocked_idx"
+            ),
+        ),
+    ]
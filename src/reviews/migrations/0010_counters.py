@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:16
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count(model, field):
+    """Number of rows of `model` whose `field` references the outer row."""
+    rows = model.objects.filter(**{field: OuterRef("pk")}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(n=Count("*")).values("n")), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Ticket = apps.get_model("reviews", "Ticket")
+    Review = apps.get_model("reviews", "Review")
+    UserFollows = apps.get_model("reviews", "UserFollows")
+    User = apps.get_model("authentication", "User")
+    ratings = Review.objects.filter(ticket=OuterRef("pk")).order_by().values("ticket")
+    Ticket.objects.update(
+        review_count=count(Review, "ticket"),
+        avg_rating=Subquery(ratings.annotate(avg=Avg("rating")).values("avg")),
+    )
+    User.objects.update(
+        ticket_count=count(Ticket, "user"),
+        review_count=count(Review, "user"),
+        follower_count=count(UserFollows, "followed_user"),
+        following_count=count(UserFollows, "user"),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0002_counters"),
+        ("reviews", "0009_image_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticket",
+            name="avg_rating",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="ticket",
+            name="review_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations
+
+# The index as created by reviews.search at the time of this migration:
+# documents are ``id * 2`` for a ticket and ``id * 2 + 1`` for a review
+STATEMENTS = {
+    "sqlite": (
+        (
+            "CREATE VIRTUAL TABLE reviews_search USING fts5("
+            "title, text, tokenize = 'unicode61 remove_diacritics 2')"
+        ),
+        (
+            "INSERT INTO reviews_search (reviews_search, rank) "
+            "VALUES ('rank', 'bm25(4, 1)')"
+        ),
+        (
+            "INSERT INTO reviews_search (rowid, title, text) "
+            "SELECT id * 2, title, description FROM reviews_ticket"
+        ),
+        (
+            "INSERT INTO reviews_search (rowid, title, text) "
+            "SELECT id * 2 + 1, headline, body FROM reviews_review"
+        ),
+        "INSERT INTO reviews_search (reviews_search) VALUES ('optimize')",
+    ),
+    "postgresql": (
+        (
+            "CREATE TABLE reviews_search "
+            "(id bigint PRIMARY KEY, document tsvector NOT NULL)"
+        ),
+        (
+            "CREATE INDEX reviews_search_document_idx ON reviews_search "
+            "USING gin (document)"
+        ),
+        (
+            "INSERT INTO reviews_search (id, document) "
+            "SELECT id * 2, setweight(to_tsvector('french', title), 'A') "
+            "|| setweight(to_tsvector('french', description), 'B') "
+            "FROM reviews_ticket"
+        ),
+        (
+            "INSERT INTO reviews_search (id, document) "
+            "SELECT id * 2 + 1, setweight(to_tsvector('french', headline), 'A') "
+            "|| setweight(to_tsvector('french', body), 'B') "
+            "FROM reviews_review"
+        ),
+        "ANALYZE reviews_search",
+    ),
+}
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in STATEMENTS:
+        raise NotImplementedError(f"No search index for {vendor}")
+    with schema_editor.connection.cursor() as cursor:
+        for statement in STATEMENTS[vendor]:
+            cursor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE reviews_search")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reviews", "0010_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -6,14 +6,60 @@ from django.db import models
 class Ticket(models.Model):
     title = models.CharField(max_length=128)
     description = models.TextField(max_length=2048, blank=True)
+    # Indexed by ticket_user_time_idx
     user = models.ForeignKey(
-        to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="tickets"
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="tickets",
+        db_index=False,
     )
     image = models.ImageField(null=True, blank=True)
+    # Thumbnails of the image: {extension: {width: file name}}
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # False while the uploaded image waits for its processing job
+    image_ready = models.BooleanField(default=True, editable=False)
+    # Denormalized aggregates of the reviews, maintained by signals
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    avg_rating = models.FloatField(null=True, editable=False)
     time_created = models.DateTimeField(auto_now_add=True)
+    # Modification version of the cached card fragments, also changed when
+    # a review is added or removed
+    time_updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ("-time_created",)
+        indexes = (
+            # Feed streams: posts of some users, most recent first
+            models.Index(
+                fields=["user", "-time_created", "-id"],
+                name="ticket_user_time_idx",
+            ),
+        )
+
+    def get_srcset(self, extension):
+        variants = self.image_variants.get(extension, {})
+        return ", ".join(
+            f"{self.image.storage.url(variants[width])} {width}w"
+            for width in sorted(variants, key=int)
+        )
+
+    @property
+    def has_review(self):
+        return self.review_count > 0
+
+    @property
+    def webp_srcset(self):
+        return self.get_srcset("webp")
+
+    @property
+    def jpeg_srcset(self):
+        return self.get_srcset("jpg")
+
+    @property
+    def thumbnail_url(self):
+        """Url of the smallest JPEG thumbnail."""
+        variants = self.image_variants.get("jpg", {})
+        return self.image.storage.url(variants[min(variants, key=int)])
 
 
 class Review(models.Model):
@@ -26,20 +72,42 @@ class Review(models.Model):
     )
     headline = models.CharField(max_length=128)
     body = models.CharField(max_length=8192, blank=True)
+    # Indexed by review_user_time_idx
     user = models.ForeignKey(
-        to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reviews"
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="reviews",
+        db_index=False,
     )
     time_created = models.DateTimeField(auto_now_add=True)
+    # Modification version of the cached card fragments
+    time_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = (
+            # Feed streams: posts of some users, most recent first
+            models.Index(
+                fields=["user", "-time_created", "-id"],
+                name="review_user_time_idx",
+            ),
+            # Reviews answering a ticket, and by whom
+            models.Index(fields=["ticket", "user"], name="review_ticket_user_idx"),
+        )
 
 
 class UserFollows(models.Model):
+    # Indexed by the (user, -id) and (followed_user, -id) indexes
     user = models.ForeignKey(
-        to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="following"
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="following",
+        db_index=False,
     )
     followed_user = models.ForeignKey(
         to=settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name="followed_by",
+        db_index=False,
     )
 
     class Meta:
@@ -49,6 +117,17 @@ class UserFollows(models.Model):
             "user",
             "followed_user",
         )
+        indexes = (
+            # Followers of a user (unique_together covers the other side)
+            models.Index(
+                fields=["followed_user", "user"], name="userfollows_followed_idx"
+            ),
+            # Pages of the follows and followers of a user, most recent first
+            models.Index(fields=["user", "-id"], name="userfollows_user_id_idx"),
+            models.Index(
+                fields=["followed_user", "-id"], name="userfollows_followed_id_idx"
+            ),
+        )
 
 
 class UserBlocked(models.Model):
@@ -66,3 +145,76 @@ class UserBlocked(models.Model):
             "user",
             "blocked_user",
         )
+        indexes = (
+            # Users who blocked a user (unique_together covers the other side)
+            models.Index(
+                fields=["blocked_user", "user"], name="userblocked_blocked_idx"
+            ),
+        )
+
+
+class FeedEntry(models.Model):
+    """
+    A post pushed to the inbox of a user who can see it.
+    Only maintained when the FEED_FANOUT_ON_WRITE setting is enabled.
+    """
+
+    owner = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+    )
+    ticket = models.ForeignKey(
+        to=Ticket, on_delete=models.CASCADE, null=True, related_name="+"
+    )
+    review = models.ForeignKey(
+        to=Review, on_delete=models.CASCADE, null=True, related_name="+"
+    )
+    # Copy of the post sort key, so a page is a single index range scan
+    content_type = models.CharField(max_length=6)
+    post_id = models.BigIntegerField()
+    time_created = models.DateTimeField()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=["owner", "content_type", "post_id"],
+                name="unique_feed_entry",
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=["owner", "-time_created", "-content_type", "-post_id"],
+                name="feed_entry_owner_order_idx",
+            ),
+        )
+
+
+class ImageJob(models.Model):
+    """Processing of an uploaded ticket image, run outside of the request."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "En attente"),
+        (RUNNING, "En cours"),
+        (DONE, "Terminé"),
+        (FAILED, "Échoué"),
+    )
+
+    ticket = models.ForeignKey(
+        to=Ticket, on_delete=models.CASCADE, related_name="image_jobs"
+    )
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    error = models.TextField(blank=True)
+    time_created = models.DateTimeField(auto_now_add=True)
+    time_started = models.DateTimeField(null=True)
+    time_finished = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = (
+            # Oldest pending jobs first
+            models.Index(fields=["status", "time_created"], name="imagejob_queue_idx"),
+        )
@@ -0,0 +1,239 @@
+"""
+Requests sent by the ``benchmark`` and ``load_test`` commands: the main
+pages, the search, the create views and the JSON API, sent through the
+test client by a pool of logged-in users. The sync Client goes through
+Django's WSGI-style handler and the AsyncClient through its ASGI handler.
+"""
+
+import time
+from collections.abc import Callable
+from contextlib import nullcontext
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from reviews import feed, search, views
+from reviews.models import Ticket
+
+User = get_user_model()
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    # Returns the (url, data) of a request of `user`
+    build: Callable
+    writes: bool = False
+    # Sent with the ETag of a first, unmeasured, request: measures the 304
+    revalidate: bool = False
+
+
+def nth_id(queryset, index):
+    return queryset.order_by("id").values_list("id", flat=True)[index]
+
+
+def get_endpoints(rng):
+    ticket_count = Ticket.objects.count()
+
+    def any_ticket(user):
+        return nth_id(Ticket.objects.all(), rng.randrange(ticket_count))
+
+    def other_ticket(user):
+        tickets = Ticket.objects.exclude(user=user)
+        return nth_id(tickets, rng.randrange(tickets.count()))
+
+    def second_page(url_name):
+        def build(user):
+            # Cursor of the second page of the feed, built outside of the
+            # measure
+            token = feed.get_page(feed.home_streams(user)).next_token
+            return reverse(url_name), {"cursor": token} if token else {}
+
+        return build
+
+    def search_next_page(user):
+        # Cursor of the second page of the results, built outside of the
+        # measure
+        query = search_query(user)
+        page = search.get_page(user, query["q"], page_size=views.FIRST_PAGE_SIZE)
+        return {**query, "cursor": page.next_token} if page.next_token else query
+
+    def search_query(user):
+        # A word of a random ticket title, as typed by the user
+        title = Ticket.objects.get(id=any_ticket(user)).title
+        words = [word for word in title.split() if len(word) > 3] or [title]
+        return {"q": rng.choice(words).lower()}
+
+    def username_prefix(user):
+        # The first letters of a random username, as typed in the follow form
+        users = User.objects.filter(is_superuser=False)
+        username = users.get(id=nth_id(users, rng.randrange(users.count()))).username
+        return {"q": username[: rng.randint(1, 4)]}
+
+    def not_followed(user):
+        users = User.objects.exclude(id=user.id).exclude(
+            id__in=user.following.values("followed_user_id")
+        )
+        return {"username": users.order_by("?").values_list("username", flat=True)[0]}
+
+    def new_post():
+        return {
+            "title": "Benchmark",
+            "description": "Ticket du benchmark",
+            "headline": "Benchmark",
+            "rating": rng.randint(0, 5),
+            "body": "Critique du benchmark",
+        }
+
+    return [
+        Endpoint("home", "get", lambda user: (reverse("home"), {})),
+        Endpoint("home-page-2", "get", second_page("home")),
+        Endpoint("home-partial-2", "get", second_page("home-partial")),
+        Endpoint("user-posts", "get", lambda user: (reverse("user-posts-list"), {})),
+        Endpoint(
+            "ticket-detail",
+            "get",
+            lambda user: (reverse("ticket-detail", args=[any_ticket(user)]), {}),
+        ),
+        Endpoint(
+            "home-revalidate",
+            "get",
+            lambda user: (reverse("home"), {}),
+            revalidate=True,
+        ),
+        Endpoint(
+            "ticket-detail-revalidate",
+            "get",
+            lambda user: (reverse("ticket-detail", args=[any_ticket(user)]), {}),
+            revalidate=True,
+        ),
+        Endpoint("user-follow", "get", lambda user: (reverse("user-follow"), {})),
+        Endpoint(
+            "user-follow-create",
+            "post",
+            lambda user: (reverse("user-follow"), not_followed(user)),
+            writes=True,
+        ),
+        Endpoint("search", "get", lambda user: (reverse("search"), search_query(user))),
+        Endpoint(
+            "search-partial-2",
+            "get",
+            lambda user: (reverse("search-partial"), search_next_page(user)),
+        ),
+        Endpoint(
+            "ticket-create",
+            "post",
+            lambda user: (reverse("ticket-create"), new_post()),
+            writes=True,
+        ),
+        Endpoint(
+            "review-and-ticket-create",
+            "post",
+            lambda user: (reverse("review-and-ticket-create"), new_post()),
+            writes=True,
+        ),
+        Endpoint(
+            "review-create",
+            "post",
+            lambda user: (
+                reverse("review-create", args=[other_ticket(user)]),
+                new_post(),
+            ),
+            writes=True,
+        ),
+        Endpoint("api-feed", "get", lambda user: (reverse("api-feed"), {})),
+        Endpoint("api-feed-page-2", "get", second_page("api-feed")),
+        Endpoint(
+            "api-feed-sparse",
+            "get",
+            lambda user: (
+                reverse("api-feed"),
+                {"fields": "author,title,headline,rating,ticket_id"},
+            ),
+        ),
+        Endpoint("api-user-posts", "get", lambda user: (reverse("api-user-posts"), {})),
+        Endpoint(
+            "api-ticket-detail",
+            "get",
+            lambda user: (reverse("api-ticket-detail", args=[any_ticket(user)]), {}),
+        ),
+        Endpoint("api-following", "get", lambda user: (reverse("api-following"), {})),
+        Endpoint(
+            "api-usernames",
+            "get",
+            lambda user: (reverse("api-usernames"), username_prefix(user)),
+        ),
+    ]
+
+
+def select_endpoints(endpoints, names):
+    """Returns the `endpoints` named in `names`, all of them if it's empty."""
+    if not names:
+        return endpoints
+    unknown = set(names) - {endpoint.name for endpoint in endpoints}
+    if unknown:
+        raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+    return [endpoint for endpoint in endpoints if endpoint.name in names]
+
+
+def get_users(rng, count):
+    users = User.objects.filter(is_superuser=False)
+    total = users.count()
+    if not total:
+        raise CommandError("The database has no user")
+    indexes = sorted(rng.sample(range(total), min(count, total)))
+    return [User.objects.get(id=nth_id(users, index)) for index in indexes]
+
+
+def log_in(users, client_class=Client, **client_options):
+    """Returns a logged-in test client per user id."""
+    clients = {}
+    for user in users:
+        clients[user.id] = client_class(**client_options)
+        clients[user.id].force_login(user)
+    return clients
+
+
+def get_revalidation_headers(client, endpoint, url, data):
+    """Returns the conditional headers of a request, with a first request."""
+    if not endpoint.revalidate:
+        return {}
+    etag = getattr(client, endpoint.method)(url, data).get("ETag")
+    return {"If-None-Match": etag} if etag else {}
+
+
+def send(client, endpoint, user, rollback=True, recorder=None):
+    """
+    Sends one request of `user` and returns the response and its duration.
+    With `rollback`, writes are rolled back so the dataset doesn't change.
+    `recorder` is entered around the request only.
+    """
+    url, data = endpoint.build(user)
+    headers = get_revalidation_headers(client, endpoint, url, data)
+    rollback = rollback and endpoint.writes
+    with transaction.atomic() if rollback else nullcontext():
+        with recorder or nullcontext():
+            start = time.perf_counter()
+            response = getattr(client, endpoint.method)(url, data, headers=headers)
+            elapsed = time.perf_counter() - start
+        if rollback:
+            transaction.set_rollback(True)
+    return response, elapsed
+
+
+async def asend(client, endpoint, user):
+    """Async send, with an AsyncClient. Writes are kept."""
+    url, data = await sync_to_async(endpoint.build)(user)
+    headers = {}
+    if endpoint.revalidate:
+        etag = (await getattr(client, endpoint.method)(url, data)).get("ETag")
+        headers = {"If-None-Match": etag} if etag else {}
+    start = time.perf_counter()
+    response = await getattr(client, endpoint.method)(url, data, headers=headers)
+    return response, time.perf_counter() - start
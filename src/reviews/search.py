@@ -0,0 +1,300 @@
+"""
+Full-text search over the tickets (title, description) and the reviews
+(headline, body).
+
+The index is an SQLite FTS5 table, or a tsvector table with a GIN index on
+PostgreSQL, kept in sync by the signals. A post is indexed under a single
+integer, ``id * 2`` for a ticket and ``id * 2 + 1`` for a review, so
+updating or deleting it is a primary key lookup. Writes that bypass the
+signals (bulk_create, raw deletes) must be followed by `rebuild`.
+
+Results are ranked by relevance, titles weighing more than texts, and only
+include the posts the user can read in the feed. They are paginated by a
+cursor on the (score, document) pair, like the feed.
+"""
+
+import base64
+import json
+import re
+from dataclasses import dataclass
+
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+from reviews import feed
+from reviews.models import Review, Ticket
+
+TABLE = "reviews_search"
+
+# Ranking weights of the title and of the text
+TITLE_WEIGHT = 4
+TEXT_WEIGHT = 1
+
+# The last word of a query matches the words it starts, from this length:
+# shorter prefixes match too many words to be merged quickly
+MIN_PREFIX = 3
+
+_WORD = re.compile(r"\w+")
+
+
+def document_id(post):
+    return post.id * 2 + isinstance(post, Review)
+
+
+def get_backend(connection):
+    if connection.vendor == "postgresql":
+        return PostgresBackend()
+    if connection.vendor == "sqlite":
+        return SqliteBackend()
+    raise NotImplementedError(f"No search index for {connection.vendor}")
+
+
+class SqliteBackend:
+    key = "rowid"
+
+    def create(self, cursor):
+        # remove_diacritics: "critique" matches "Critiqué"
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            "title, text, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        # bm25() with the weights of the columns, read as the rank column
+        cursor.execute(
+            f"INSERT INTO {TABLE} ({TABLE}, rank) "
+            f"VALUES ('rank', 'bm25({TITLE_WEIGHT}, {TEXT_WEIGHT})')"
+        )
+
+    def insert(self, cursor, sql, params=()):
+        """Indexes the (document id, title, text) rows selected by `sql`."""
+        cursor.execute(f"INSERT INTO {TABLE} (rowid, title, text) {sql}", params)
+
+    def optimize(self, cursor):
+        # Merges the b-trees written by each insert into one
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+    def matches(self, query):
+        """
+        Returns the SQL and parameters selecting the (document, score) of
+        the documents matching `query`, the lowest scores first, or None if
+        it has no word.
+        """
+        words = _WORD.findall(query)
+        if not words:
+            return None
+        # Quoted, the words can't be read as FTS5 operators
+        terms = [f'"{word}"' for word in words]
+        if len(words[-1]) >= MIN_PREFIX:
+            terms[-1] += "*"
+        sql = (
+            f"SELECT rowid AS document, rank AS score FROM {TABLE} "
+            f"WHERE {TABLE} MATCH %s"
+        )
+        return sql, [" ".join(terms)]
+
+
+class PostgresBackend:
+    key = "id"
+    # Weights of the A (title) and B (text) labels, as {D, C, B, A}
+    weights = f"{{0, 0, {TEXT_WEIGHT / TITLE_WEIGHT}, 1}}"
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (id bigint PRIMARY KEY, document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX {TABLE}_document_idx ON {TABLE} USING gin (document)"
+        )
+
+    def insert(self, cursor, sql, params=()):
+        cursor.execute(
+            f"INSERT INTO {TABLE} (id, document) "
+            "SELECT id, setweight(to_tsvector('french', title), 'A') "
+            "|| setweight(to_tsvector('french', text), 'B') "
+            f"FROM ({sql}) AS posts (id, title, text)",
+            params,
+        )
+
+    def optimize(self, cursor):
+        cursor.execute(f"ANALYZE {TABLE}")
+
+    def matches(self, query):
+        if not _WORD.search(query):
+            return None
+        # ts_rank() is higher for better matches
+        sql = (
+            f"SELECT id AS document, -ts_rank('{self.weights}', document, query) "
+            f"AS score FROM {TABLE}, websearch_to_tsquery('french', %s) AS query "
+            "WHERE document @@ query"
+        )
+        return sql, [query]
+
+
+# Title and text of the indexed models
+FIELDS = {"ticket": ("title", "description"), "review": ("headline", "body")}
+
+
+def document_rows(queryset):
+    """
+    Returns the SQL and parameters selecting the (document id, title, text)
+    of the tickets or reviews of `queryset`.
+    """
+    model_name = queryset.model._meta.model_name
+    rows = queryset.order_by().values_list(
+        F("id") * 2 + int(model_name == "review"), *FIELDS[model_name]
+    )
+    return rows.query.sql_with_params()
+
+
+def delete_documents(cursor, backend, documents):
+    cursor.execute(
+        f"DELETE FROM {TABLE} WHERE {backend.key} IN "
+        f"({', '.join(['%s'] * len(documents))})",
+        documents,
+    )
+
+
+def index_post(post):
+    """Adds `post` to the index, or updates it."""
+    model = type(post)
+    connection = connections[router.db_for_write(model)]
+    backend = get_backend(connection)
+    with connection.cursor() as cursor:
+        delete_documents(cursor, backend, [document_id(post)])
+        backend.insert(cursor, *document_rows(model.objects.filter(pk=post.pk)))
+
+
+def remove_post(post):
+    connection = connections[router.db_for_write(type(post))]
+    with connection.cursor() as cursor:
+        delete_documents(cursor, get_backend(connection), [document_id(post)])
+
+
+def fill_index(connection, querysets):
+    """Indexes the posts of `querysets`, which aren't indexed yet."""
+    backend = get_backend(connection)
+    with connection.cursor() as cursor:
+        for queryset in querysets:
+            backend.insert(cursor, *document_rows(queryset))
+        backend.optimize(cursor)
+
+
+def rebuild():
+    """
+    Indexes every post again, with INSERT ... SELECT statements, in a
+    transaction: searches read the previous index meanwhile.
+    """
+    connection = connections[router.db_for_write(Ticket)]
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}")
+        fill_index(connection, [Ticket.objects.all(), Review.objects.all()])
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """Score and document of the last result of a page."""
+
+    score: float
+    document: int
+
+    def encode(self):
+        payload = json.dumps([self.score, self.document])
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token):
+        """
+        Returns None for an empty token, raises ValueError if it is invalid.
+        """
+        if not token:
+            return None
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            score, document = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return cls(float(score), int(document))
+        except (TypeError, ValueError) as error:
+            raise ValueError("Invalid search cursor") from error
+
+
+def visible_documents(user):
+    """
+    Returns the SQL and parameters of the condition keeping the documents
+    of the posts `user` can read: the ones of its home feed. Each stream
+    of the feed is a correlated EXISTS reading the matched post by primary
+    key, so the cost follows the number of matches rather than the size of
+    the feed.
+    """
+    conditions, params = [], []
+    for content_type, queryset in feed.home_streams(user):
+        posts = queryset.filter(id=RawSQL("document / 2", ())).values("id")
+        sql, stream_params = posts.order_by().query.sql_with_params()
+        # %% is the modulo operator once the parameters are interpolated
+        conditions.append(
+            f"(document %% 2 = {int(content_type == feed.REVIEW)} AND EXISTS ({sql}))"
+        )
+        params += stream_params
+    return " OR ".join(conditions), params
+
+
+def load_posts(documents, using):
+    """Returns the posts of `documents`, in the same order."""
+    ids = {feed.TICKET: [], feed.REVIEW: []}
+    for document in documents:
+        ids[feed.REVIEW if document % 2 else feed.TICKET].append(document // 2)
+    posts = {}
+    for content_type, model in ((feed.TICKET, Ticket), (feed.REVIEW, Review)):
+        queryset = feed.LOADERS[content_type](
+            model.objects.using(using).filter(id__in=ids[content_type])
+        )
+        for post in queryset:
+            post.content_type = content_type
+            posts[document_id(post)] = post
+    # A post deleted since the search is skipped
+    return [posts[document] for document in documents if document in posts]
+
+
+def page_query(backend, user, query, cursor=None, page_size=feed.DEFAULT_PAGE_SIZE):
+    """
+    Returns the SQL and parameters selecting the (document, score) of the
+    results of a page, plus one telling whether there is a next page, or
+    None if `query` has no word.
+    """
+    matches = backend.matches(query)
+    if matches is None:
+        return None
+    sql, params = matches
+    visible, visible_params = visible_documents(user)
+    conditions, params = [f"({visible})"], [*params, *visible_params]
+    if cursor is not None:
+        conditions.append("(score > %s OR (score = %s AND document > %s))")
+        params += [cursor.score, cursor.score, cursor.document]
+    sql = (
+        f"SELECT document, score FROM ({sql}) AS matches "
+        f"WHERE {' AND '.join(conditions)} "
+        "ORDER BY score, document LIMIT %s"
+    )
+    return sql, [*params, page_size + 1]
+
+
+def get_page(user, query, cursor=None, page_size=feed.DEFAULT_PAGE_SIZE):
+    """
+    Returns the page of the posts readable by `user` matching `query`, best
+    first, that starts right after `cursor`.
+    """
+    using = router.db_for_read(Ticket)
+    connection = connections[using]
+    sql = page_query(get_backend(connection), user, query, cursor, page_size)
+    if sql is None:
+        return feed.FeedPage(posts=[], next_cursor=None)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(*sql)
+        results = db_cursor.fetchall()
+
+    next_cursor = None
+    if len(results) > page_size:
+        results = results[:page_size]
+        document, score = results[-1]
+        next_cursor = Cursor(score, document)
+    posts = load_posts([document for document, _ in results], using)
+    return feed.FeedPage(posts=posts, next_cursor=next_cursor)
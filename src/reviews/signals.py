@@ -0,0 +1,113 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from reviews import counters, feed_cache, inbox, search
+from reviews.models import Review, Ticket, UserBlocked, UserFollows
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, created, **kwargs):
+    if created and inbox.is_enabled():
+        inbox.push_ticket(instance)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    if created and inbox.is_enabled():
+        inbox.push_review(instance)
+
+
+@receiver(post_save, sender=UserFollows)
+def user_follow_saved(sender, instance, created, **kwargs):
+    if created and inbox.is_enabled():
+        inbox.backfill_follow(instance)
+
+
+@receiver(post_delete, sender=UserFollows)
+def user_follow_deleted(sender, instance, **kwargs):
+    if inbox.is_enabled():
+        inbox.purge_follow(instance)
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def ticket_changed(sender, instance, **kwargs):
+    feed_cache.bump_ticket_readers(instance)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    feed_cache.bump_review_readers(instance)
+
+
+@receiver(post_save, sender=UserFollows)
+@receiver(post_delete, sender=UserFollows)
+def user_follow_changed(sender, instance, **kwargs):
+    feed_cache.bump_versions([instance.user_id])
+
+
+@receiver(post_save, sender=UserBlocked)
+@receiver(post_delete, sender=UserBlocked)
+def user_blocked_changed(sender, instance, **kwargs):
+    feed_cache.bump_versions([instance.user_id, instance.blocked_user_id])
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_deleted(sender, instance, **kwargs):
+    feed_cache.delete_card_fragment("ticket_card", instance)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    feed_cache.delete_card_fragment("review_card", instance)
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_counted(sender, instance, created, **kwargs):
+    if created:
+        counters.ticket_added(instance)
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_uncounted(sender, instance, **kwargs):
+    counters.ticket_removed(instance)
+
+
+@receiver(post_save, sender=Review)
+def review_counted(sender, instance, created, **kwargs):
+    if created:
+        counters.review_added(instance)
+    else:
+        counters.review_edited(instance)
+
+
+@receiver(post_delete, sender=Review)
+def review_uncounted(sender, instance, **kwargs):
+    counters.review_removed(instance)
+
+
+@receiver(post_save, sender=UserFollows)
+def user_follow_counted(sender, instance, created, **kwargs):
+    if created:
+        counters.follow_added(instance)
+
+
+@receiver(post_delete, sender=UserFollows)
+def user_follow_uncounted(sender, instance, **kwargs):
+    counters.follow_removed(instance)
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_save, sender=Review)
+def post_indexed(sender, instance, update_fields, **kwargs):
+    # Saves of other fields (image processing) leave the text unchanged
+    fields = search.FIELDS[sender._meta.model_name]
+    if update_fields is None or not update_fields.isdisjoint(fields):
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Ticket)
+@receiver(post_delete, sender=Review)
+def post_unindexed(sender, instance, **kwargs):
+    search.remove_post(instance)
@@ -0,0 +1,398 @@
+import re
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from authentication.models import User
+from config.middleware import ReplicaRoutingMiddleware
+from config.routers import ReplicaRouter
+from reviews import counters, feed, feed_cache, follows, jobs, search
+from reviews.models import ImageJob, Review, Ticket, UserBlocked, UserFollows
+from reviews.views import HomeView
+
+
+@override_settings(FEED_CACHE_ENABLED=False)
+class FeedQueryCountTests(TestCase):
+    """The queries of a feed page don't depend on the number of its posts."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="password")
+        self.followed = User.objects.create_user("bob", password="password")
+        self.other = User.objects.create_user("carol", password="password")
+        UserFollows.objects.create(user=self.user, followed_user=self.followed)
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        caches["template_fragments"].clear()
+
+    def add_posts(self, count):
+        """Adds `count` posts of each kind shown in the feeds of the user."""
+        for number in range(count):
+            own_ticket = Ticket.objects.create(user=self.user, title=f"Own {number}")
+            ticket = Ticket.objects.create(user=self.followed, title=f"Ticket {number}")
+            Review.objects.create(
+                user=self.followed, ticket=ticket, rating=3, headline="Followed"
+            )
+            Review.objects.create(
+                user=self.user, ticket=ticket, rating=4, headline="Own"
+            )
+            # Reply of someone the user doesn't follow
+            Review.objects.create(
+                user=self.other, ticket=own_ticket, rating=5, headline="Reply"
+            )
+
+    def assertConstantQueries(self, url):
+        self.add_posts(1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_posts(4)
+        # Cards rendered again rather than read from the fragment cache
+        caches["template_fragments"].clear()
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["object_list"]), 10)
+
+    def test_home(self):
+        self.assertConstantQueries(reverse("home"))
+
+    def test_user_posts(self):
+        self.assertConstantQueries(reverse("user-posts-list"))
+
+
+class BlockedUserTests(TestCase):
+    """The posts of a blocked user are hidden from both users."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="password")
+        self.blocked = User.objects.create_user("bob", password="password")
+        self.blocking = User.objects.create_user("carol", password="password")
+        self.followed = User.objects.create_user("dave", password="password")
+        for followed in (self.blocked, self.blocking, self.followed):
+            UserFollows.objects.create(user=self.user, followed_user=followed)
+        UserBlocked.objects.create(user=self.user, blocked_user=self.blocked)
+        UserBlocked.objects.create(user=self.blocking, blocked_user=self.user)
+
+    def home_posts(self):
+        return feed.get_page(feed.home_streams(self.user)).posts
+
+    def test_followed_posts_hidden(self):
+        tickets = [
+            Ticket.objects.create(user=author, title=author.username)
+            for author in (self.blocked, self.blocking, self.followed)
+        ]
+        self.assertEqual(self.home_posts(), [tickets[-1]])
+
+    def test_replies_hidden(self):
+        ticket = Ticket.objects.create(user=self.user, title="Own")
+        reviews = [
+            Review.objects.create(user=author, ticket=ticket, rating=3)
+            for author in (self.blocked, self.blocking, self.followed)
+        ]
+        self.assertEqual(self.home_posts(), [reviews[-1], ticket])
+
+
+class CounterTests(TestCase):
+    """The signals keep the counters equal to the tables."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="password")
+        self.reviewer = User.objects.create_user("bob", password="password")
+
+    def assertCounters(self, obj, **expected):
+        obj.refresh_from_db()
+        self.assertEqual({field: getattr(obj, field) for field in expected}, expected)
+
+    def test_posts(self):
+        ticket = Ticket.objects.create(user=self.user, title="Ticket")
+        Review.objects.create(user=self.user, ticket=ticket, rating=4)
+        review = Review.objects.create(user=self.reviewer, ticket=ticket, rating=1)
+        self.assertCounters(ticket, review_count=2, avg_rating=2.5)
+        self.assertCounters(self.user, ticket_count=1, review_count=1)
+        self.assertCounters(self.reviewer, ticket_count=0, review_count=1)
+
+        review.delete()
+        self.assertCounters(ticket, review_count=1, avg_rating=4.0)
+        self.assertCounters(self.reviewer, review_count=0)
+        self.assertEqual(set(counters.reconcile(dry_run=True).values()), {0})
+
+        # The review of the ticket is deleted with it
+        ticket.delete()
+        self.assertCounters(self.user, ticket_count=0, review_count=0)
+
+    def test_follows(self):
+        follow = UserFollows.objects.create(user=self.user, followed_user=self.reviewer)
+        self.assertCounters(self.user, following_count=1, follower_count=0)
+        self.assertCounters(self.reviewer, following_count=0, follower_count=1)
+
+        follow.delete()
+        self.assertCounters(self.user, following_count=0)
+        self.assertCounters(self.reviewer, follower_count=0)
+
+
+class FeedCacheVersionTests(TestCase):
+    """Writes change the feed version of the users who read them."""
+
+    def setUp(self):
+        feed_cache.get_cache().clear()
+        self.user = User.objects.create_user("alice", password="password")
+
+    def test_bumped_on_commit(self):
+        version = feed_cache.get_version(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.create(user=self.user, title="Ticket")
+            # Not before: a page built meanwhile would miss the ticket
+            self.assertEqual(feed_cache.get_version(self.user.id), version)
+        self.assertNotEqual(feed_cache.get_version(self.user.id), version)
+
+    def test_batch_bumped_on_commit(self):
+        User.objects.create_user("bob", password="password")
+        for unfollow in (False, True):
+            version = feed_cache.get_version(self.user.id)
+            with self.captureOnCommitCallbacks(execute=True):
+                follows.follow_many(self.user, ["bob"], unfollow=unfollow)
+                self.assertEqual(feed_cache.get_version(self.user.id), version)
+            self.assertNotEqual(feed_cache.get_version(self.user.id), version)
+            self.user.refresh_from_db()
+            self.assertEqual(self.user.following_count, int(not unfollow))
+
+
+class FollowBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="password")
+        usernames = ["bob", "carol", "dave", "erin"]
+        for username in usernames:
+            followed = User.objects.create_user(username, password="password")
+            UserFollows.objects.create(user=self.user, followed_user=followed)
+        # A follow of erin, not one of the follows of the user
+        UserFollows.objects.create(user=followed, followed_user=self.user)
+
+    def following(self):
+        return set(
+            self.user.following.values_list("followed_user__username", flat=True)
+        )
+
+    def test_unfollow(self):
+        with CaptureQueriesContext(connection) as queries:
+            follows.follow_many(self.user, ["bob"], unfollow=True)
+        # One DELETE, whatever the number of follows
+        with self.assertNumQueries(len(queries)):
+            result = follows.follow_many(
+                self.user, ["carol", "dave", "zoe"], unfollow=True
+            )
+        self.assertEqual(result.changed, ["carol", "dave"])
+        self.assertEqual(result.unknown, ["zoe"])
+        self.assertEqual(self.following(), {"erin"})
+        self.assertTrue(UserFollows.objects.filter(followed_user=self.user).exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 1)
+
+
+@override_settings(FEED_CACHE_ENABLED=False)
+class FeedRevalidationTests(TestCase):
+    """A feed page is revalidated with a 304 until something it shows changes."""
+
+    def setUp(self):
+        feed_cache.get_cache().clear()
+        caches["template_fragments"].clear()
+        self.user = User.objects.create_user("alice", password="password")
+        author = User.objects.create_user("bob", password="password")
+        reviewer = User.objects.create_user("carol", password="password")
+        # The ticket is only shown inside the card of the followed review
+        UserFollows.objects.create(user=self.user, followed_user=reviewer)
+        self.ticket = Ticket.objects.create(user=author, title="Before")
+        self.review = Review.objects.create(
+            user=reviewer, ticket=self.ticket, rating=3, headline="Followed review"
+        )
+        self.client.force_login(self.user)
+        # The first response sets the CSRF cookie, part of the ETag
+        self.client.get(reverse("home"))
+        self.etag = self.client.get(reverse("home"))["ETag"]
+
+    def revalidate(self):
+        return self.client.get(reverse("home"), headers={"if-none-match": self.etag})
+
+    def test_unchanged(self):
+        self.assertEqual(self.revalidate().status_code, 304)
+
+    def test_ticket_of_a_followed_review_edited(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket.title = "After"
+            self.ticket.save()
+        self.assertContains(self.revalidate(), "After")
+
+    def test_review_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.review.delete()
+        self.assertNotContains(self.revalidate(), "Followed review")
+
+
+@override_settings(FEED_CACHE_ENABLED=True)
+class CachedFeedRevalidationTests(FeedRevalidationTests):
+    """The same, with the validators of the feed cache."""
+
+
+# Not a TestCase: its transaction would keep every read on the primary
+@override_settings(DATABASE_REPLICAS=["replica1"], DATABASE_STICKY_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    """After a write, the reads of the session stick to the primary."""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.session = {}
+
+    def read_database(self, method="get", write=False):
+        """Runs a request to the home feed, returns the database it reads."""
+        databases = []
+
+        def get_response(request):
+            # As the handler does, inside the middleware call
+            middleware.process_view(request, HomeView.as_view(), (), {})
+            if write:
+                self.router.db_for_write(Ticket)
+            databases.append(self.router.db_for_read(Ticket))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        request = getattr(RequestFactory(), method)(reverse("home"))
+        request.session = self.session
+        middleware(request)
+        return databases[0]
+
+    def test_replica_reads(self):
+        self.assertEqual(self.read_database(), "replica1")
+        self.assertEqual(self.read_database(method="post"), "default")
+
+    def test_read_after_write(self):
+        self.assertEqual(self.read_database(write=True), "default")
+
+    def test_sticky_after_write(self):
+        self.read_database(method="post", write=True)
+        self.assertEqual(self.read_database(), "default")
+        later = time.time() + 6
+        with mock.patch("config.middleware.time.time", return_value=later):
+            self.assertEqual(self.read_database(), "replica1")
+
+
+class CardCacheTests(TestCase):
+    """The cached cards hold localized dates: one card per language."""
+
+    def setUp(self):
+        caches["template_fragments"].clear()
+        self.user = User.objects.create_user("alice", password="password")
+        self.ticket = Ticket.objects.create(user=self.user, title="Ticket")
+        self.client.force_login(self.user)
+
+    def card_key(self, language):
+        return make_template_fragment_key(
+            "ticket_card", [self.ticket.id, self.ticket.time_updated, language]
+        )
+
+    def test_cached_per_language(self):
+        for language in ("fr", "en"):
+            self.client.get(reverse("home"), headers={"accept-language": language})
+        cache = caches["template_fragments"]
+        self.assertIn(self.card_key("fr"), cache)
+        self.assertIn(self.card_key("en"), cache)
+
+        self.ticket.delete()
+        self.assertNotIn(self.card_key("fr"), cache)
+        self.assertNotIn(self.card_key("en"), cache)
+
+
+class ImageJobTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("alice", password="password")
+        self.ticket = Ticket.objects.create(
+            user=user, title="Ticket", image="upload.png", image_ready=False
+        )
+        self.job = ImageJob.objects.create(ticket=self.ticket)
+
+    def test_unexpected_error(self):
+        with (
+            mock.patch("reviews.images.process_ticket_image", side_effect=KeyError),
+            self.assertLogs("reviews.jobs", "ERROR"),
+        ):
+            self.assertTrue(jobs.run(self.job.id))
+        self.job.refresh_from_db()
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.job.status, ImageJob.FAILED)
+        # Shown as uploaded instead of the placeholder
+        self.assertEqual(self.ticket.image.name, "upload.png")
+        self.assertTrue(self.ticket.image_ready)
+
+    def test_requeue_stale(self):
+        ImageJob.objects.filter(id=self.job.id).update(
+            status=ImageJob.RUNNING, time_started=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(jobs.requeue_stale(timedelta(hours=2)), 0)
+        self.assertEqual(jobs.requeue_stale(timedelta(minutes=10)), 1)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ImageJob.PENDING)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="password")
+        followed = User.objects.create_user("bob", password="password")
+        stranger = User.objects.create_user("carol", password="password")
+        UserFollows.objects.create(user=self.user, followed_user=followed)
+        self.ticket = Ticket.objects.create(user=followed, title="Critique du livre")
+        Ticket.objects.create(user=stranger, title="Livre invisible")
+
+    def test_placeholders(self):
+        cursor = search.Cursor(-1.5, 42)
+        for backend in (search.SqliteBackend(), search.PostgresBackend()):
+            with self.subTest(backend=type(backend).__name__):
+                sql, params = search.page_query(backend, self.user, "livre", cursor)
+                # Every other % would be read as a placeholder by psycopg
+                self.assertEqual(sql.count("%s"), len(params))
+                self.assertNotIn("%", re.sub("%[s%]", "", sql))
+
+    def test_visible_results(self):
+        page = search.get_page(self.user, "critiqué livr")
+        self.assertEqual(page.posts, [self.ticket])
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="password")
+        self.ticket = Ticket.objects.create(user=self.user, title="Ticket")
+        self.review = Review.objects.create(
+            user=self.user, ticket=self.ticket, rating=4, headline="Review"
+        )
+        self.client.force_login(self.user)
+
+    def test_fields(self):
+        response = self.client.get(reverse("api-feed"), {"fields": "title,rating"})
+        review, ticket = response.json()["results"]
+        self.assertEqual(set(review), {"type", "id", "time_created", "rating"})
+        self.assertEqual(set(ticket), {"type", "id", "time_created", "title"})
+        self.assertEqual((review["type"], review["rating"]), ("review", 4))
+        self.assertEqual((ticket["type"], ticket["title"]), ("ticket", "Ticket"))
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse("api-feed"), {"fields": "title,password"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_modified(self):
+        etag = self.client.get(reverse("api-feed"))["ETag"]
+        response = self.client.get(reverse("api-feed"), headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        Ticket.objects.create(user=self.user, title="New")
+        response = self.client.get(reverse("api-feed"), headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("api-feed")).status_code, 401)
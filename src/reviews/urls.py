@@ -3,11 +3,14 @@ from django.conf.urls.static import static
 from django.urls import path
 from django.views.generic import RedirectView
 
-from reviews import views
+from reviews import api, views
 
 urlpatterns = [
     path("", RedirectView.as_view(pattern_name="home", permanent=False)),
     path("home/", views.HomeView.as_view(), name="home"),
+    path("home/partial/", views.HomePartialView.as_view(), name="home-partial"),
+    path("search/", views.SearchView.as_view(), name="search"),
+    path("search/partial/", views.SearchPartialView.as_view(), name="search-partial"),
     path("tickets/create/", views.TicketCreateView.as_view(), name="ticket-create"),
     path(
         "tickets/<int:pk>/update/",
@@ -45,10 +48,38 @@ urlpatterns = [
         name="review-delete",
     ),
     path("user/posts", views.UserPostsView.as_view(), name="user-posts-list"),
+    path(
+        "user/posts/partial",
+        views.UserPostsPartialView.as_view(),
+        name="user-posts-partial",
+    ),
     path("user/follows", views.UserFollowView.as_view(), name="user-follow"),
+    path(
+        "user/follows/bulk",
+        views.UserFollowBulkView.as_view(),
+        name="user-follow-bulk",
+    ),
     path(
         "user/userfollow/<int:user_follow_id>/delete",
         views.UserUnfollowView.as_view(),
         name="user-unfollow",
     ),
+    path("api/feed/", api.FeedView.as_view(), name="api-feed"),
+    path("api/posts/", api.UserPostsView.as_view(), name="api-user-posts"),
+    path(
+        "api/tickets/<int:pk>/",
+        api.TicketDetailView.as_view(),
+        name="api-ticket-detail",
+    ),
+    path(
+        "api/following/",
+        api.FollowsView.as_view(relation="following"),
+        name="api-following",
+    ),
+    path(
+        "api/followers/",
+        api.FollowsView.as_view(relation="followers"),
+        name="api-followers",
+    ),
+    path("api/usernames/", api.UsernamesView.as_view(), name="api-usernames"),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
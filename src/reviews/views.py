@@ -1,65 +1,261 @@
-from itertools import chain
+import hashlib
+from datetime import datetime, timezone
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Value, CharField
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect
 from django.urls import reverse_lazy, reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.views import View
 from django.views.generic import (
     CreateView,
     UpdateView,
     DeleteView,
-    DetailView,
     FormView,
-    ListView,
 )
+from django.views.generic.base import ContextMixin, TemplateResponseMixin
 
 from authentication.models import User
-from reviews.forms import TicketForm, ReviewForm, UserFollowForm
+from reviews import feed, feed_cache, follows, inbox, search
+from reviews.forms import TicketForm, ReviewForm, UserFollowForm, UserFollowBulkForm
 from reviews.models import Ticket, Review, UserFollows
 
+# Posts of the pages rendered with the layout: enough to fill the screen,
+# the infinite scroll loads the next ones
+FIRST_PAGE_SIZE = 10
 
-class HomeView(LoginRequiredMixin, ListView):
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
     """
-    Displays the main feed for the logged-in user.
-    Combines tickets and reviews from followed users and the user's own
-    posts, then sorts them by creation date.
+    LoginRequiredMixin for async views. The user is loaded without blocking
+    the event loop, and stored as request.user for the sync code reading it
+    (templates, context processors).
     """
-    template_name = "reviews/home.html"
 
-    def get_queryset(self):
-        user = self.request.user
-        tickets = user.get_viewable_tickets().annotate(
-            content_type=Value("TICKET", CharField())
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await View.dispatch(self, request, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """
+    Answers a GET whose If-None-Match or If-Modified-Since header matches
+    the validators of the page with a 304, and otherwise renders the page
+    with render_page().
+    """
+
+    async def get_validators(self):
+        """
+        Returns the ETag and the last modification datetime of the page, or
+        (None, None) to always render it. Must be cheaper than the page.
+        """
+        return None, None
+
+    async def render_page(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def make_etag(self, *parts):
+        """
+        ETag of a page of the user depending on `parts`. The CSRF cookie is
+        part of it: the pages embed the CSRF token, which changes at login.
+        """
+        parts = (*parts, self.request.user.id, self.request.META.get("CSRF_COOKIE"))
+        value = ":".join(map(str, parts)).encode()
+        return quote_etag(hashlib.md5(value, usedforsecurity=False).hexdigest())
+
+    async def get(self, request, *args, **kwargs):
+        etag, last_modified = await self.get_validators()
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
         )
-        reviews = user.get_viewable_reviews().annotate(
-            content_type=Value("REVIEW", CharField())
+        if response is None:
+            response = await self.render_page(request, *args, **kwargs)
+        if etag is not None:
+            response.headers.setdefault("ETag", etag)
+        if last_modified is not None:
+            response.headers.setdefault("Last-Modified", http_date(last_modified))
+        # Pages of the user, revalidated on every use rather than kept by
+        # the browser for a heuristic time after their Last-Modified
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class FeedView(
+    AsyncLoginRequiredMixin,
+    ConditionalGetMixin,
+    TemplateResponseMixin,
+    ContextMixin,
+    View,
+):
+    """
+    Serves a feed of tickets and reviews one page at a time.
+    The page position is given by the opaque ``cursor`` GET parameter.
+    The next pages are loaded by the infinite scroll from the view named
+    `partial_url_name`, which renders the cards of a page only.
+    """
+    page_size = feed.DEFAULT_PAGE_SIZE
+    partial_url_name = None
+    # Page read by get_validators, rendered if it has changed
+    page = None
+
+    def get_feed_streams(self):
+        """Returns the (content_type, queryset) pairs to merge."""
+        raise NotImplementedError
+
+    def get_cursor(self):
+        try:
+            return feed.Cursor.decode(self.request.GET.get("cursor"))
+        except ValueError:
+            raise Http404("Page invalide.")
+
+    async def get_page(self, cursor):
+        return await feed.aget_page(self.get_feed_streams(), cursor, self.page_size)
+
+    async def get_validators(self):
+        """
+        Validators from the feed version of the user, changed by every
+        write shown in the feed (see feed_cache): a cache lookup, no query.
+        The version is the time of the last change, so the newest post of
+        the page isn't more recent.
+
+        Without the feed cache, the ETag identifies the posts of the page,
+        which is read here: the queries are run anyway, the rendering is
+        saved. There is no Last-Modified, since removing a post from the
+        page doesn't make it more recent.
+        """
+        cursor = self.get_cursor()
+        if not settings.FEED_CACHE_ENABLED:
+            self.page = await self.get_page(cursor)
+            etag = self.make_etag(
+                self.template_name,
+                feed.page_version(self.page),
+                cursor and cursor.encode(),
+                self.page_size,
+            )
+            return etag, None
+        version = await sync_to_async(feed_cache.get_version)(self.request.user.id)
+        etag = self.make_etag(
+            self.template_name, version, cursor and cursor.encode(), self.page_size
+        )
+        return etag, datetime.fromtimestamp(version / 1e9, timezone.utc)
+
+    async def render_page(self, request, *args, **kwargs):
+        page = self.page or await self.get_page(self.get_cursor())
+        context = self.get_context_data(
+            object_list=page.posts,
+            next_cursor=page.next_token,
+            partial_url=reverse(self.partial_url_name),
         )
+        return self.render_to_response(context)
+
 
-        # Merge the two querysets into a single sorted list
-        posts = sorted(
-            chain(reviews, tickets), key=lambda post: post.time_created, reverse=True
+class HomeView(FeedView):
+    """
+    Displays the main feed for the logged-in user.
+    Combines tickets and reviews from followed users and the user's own
+    posts, most recent first.
+    """
+    template_name = "reviews/home.html"
+    partial_url_name = "home-partial"
+    page_size = FIRST_PAGE_SIZE
+    replica_reads = True
+
+    def get_feed_streams(self):
+        return feed.home_streams(self.request.user)
+
+    async def build_page(self, cursor):
+        if inbox.is_enabled():
+            return await sync_to_async(inbox.get_page)(
+                self.request.user, cursor, self.page_size
+            )
+        return await super().get_page(cursor)
+
+    async def get_page(self, cursor):
+        if not settings.FEED_CACHE_ENABLED:
+            return await self.build_page(cursor)
+        return await feed_cache.aget_page(
+            self.request.user,
+            cursor,
+            self.page_size,
+            lambda: self.build_page(cursor),
         )
-        return posts
 
 
-class UserPostsView(LoginRequiredMixin, ListView):
+class UserPostsView(FeedView):
     """
     Displays a list of all posts (tickets and reviews) created by the
     logged-in user.
     """
     template_name = "reviews/user/posts_list.html"
+    partial_url_name = "user-posts-partial"
+    page_size = FIRST_PAGE_SIZE
+    replica_reads = True
 
-    def get_queryset(self):
+    def get_feed_streams(self):
         user: User = self.request.user
-        tickets = user.tickets.all().annotate(content_type=Value("TICKET", CharField()))
-        reviews = user.reviews.all().annotate(content_type=Value("REVIEW", CharField()))
+        return [(feed.TICKET, user.tickets.all()), (feed.REVIEW, user.reviews.all())]
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(show_creator_button=True, **kwargs)
+
+
+class HomePartialView(HomeView):
+    """Renders the cards of a page of the home feed, for the infinite scroll."""
+    template_name = "reviews/feed/posts.html"
+    page_size = feed.DEFAULT_PAGE_SIZE
+
+
+class UserPostsPartialView(UserPostsView):
+    """Renders the cards of a page of the user's posts."""
+    template_name = "reviews/feed/posts.html"
+    page_size = feed.DEFAULT_PAGE_SIZE
+
+
+class SearchView(FeedView):
+    """
+    Displays the posts readable by the user matching the ``q`` GET
+    parameter, best match first.
+    """
+    template_name = "reviews/search.html"
+    partial_url_name = "search-partial"
+    page_size = FIRST_PAGE_SIZE
+    replica_reads = True
+
+    def get_query(self):
+        return self.request.GET.get("q", "").strip()
+
+    def get_cursor(self):
+        try:
+            return search.Cursor.decode(self.request.GET.get("cursor"))
+        except ValueError:
+            raise Http404("Page invalide.")
+
+    async def get_validators(self):
+        # The scores depend on the whole index, not only on the feed
+        return None, None
+
+    async def get_page(self, cursor):
+        return await sync_to_async(search.get_page)(
+            self.request.user, self.get_query(), cursor, self.page_size
+        )
 
-        # Merge the two querysets into a single sorted list
-        posts = sorted(
-            chain(reviews, tickets), key=lambda post: post.time_created, reverse=True
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(
+            query=self.get_query(), more_label="Résultats suivants", **kwargs
         )
-        return posts
+
+
+class SearchPartialView(SearchView):
+    """Renders the cards of a page of search results."""
+    template_name = "reviews/feed/posts.html"
+    page_size = feed.DEFAULT_PAGE_SIZE
 
 
 class TicketCreateView(LoginRequiredMixin, CreateView):
@@ -82,10 +278,36 @@ class TicketUpdateView(LoginRequiredMixin, UpdateView):
     success_url = reverse_lazy("home")
 
 
-class TicketDetailView(LoginRequiredMixin, DetailView):
+class TicketDetailView(
+    AsyncLoginRequiredMixin,
+    ConditionalGetMixin,
+    TemplateResponseMixin,
+    ContextMixin,
+    View,
+):
     """Displays the details of a specific ticket."""
-    model = Ticket
-    template_name_suffix = "/detail"
+    template_name = "reviews/ticket/detail.html"
+    replica_reads = True
+
+    async def get_validators(self):
+        # time_updated also changes when a review is added or removed, which
+        # shows or hides the review button (see signals)
+        time_updated = await (
+            Ticket.objects.filter(pk=self.kwargs["pk"])
+            .values_list("time_updated", flat=True)
+            .afirst()
+        )
+        if time_updated is None:
+            return None, None
+        return self.make_etag(self.kwargs["pk"], time_updated), time_updated
+
+    async def render_page(self, request, pk, *args, **kwargs):
+        try:
+            ticket = await feed.load_tickets(Ticket.objects.filter(pk=pk)).aget()
+        except Ticket.DoesNotExist:
+            raise Http404("Ticket introuvable.")
+        context = self.get_context_data(object=ticket, ticket=ticket)
+        return self.render_to_response(context)
 
 
 class TicketDeleteView(LoginRequiredMixin, DeleteView):
@@ -180,12 +402,70 @@ class UserFollowView(LoginRequiredMixin, FormView):
     success_url = reverse_lazy("user-follow")
     template_name = "reviews/user/follow_form.html"
 
-    def form_valid(self, form):
+    def get_cursor(self, name):
+        cursor = self.request.GET.get(name)
+        if not cursor:
+            return None
+        try:
+            return int(cursor)
+        except ValueError:
+            raise Http404("Page invalide.")
+
+    def get_context_data(self, **kwargs):
         user = self.request.user
-        username = form.cleaned_data["username"]
-        user_to_follow = User.objects.get_by_natural_key(username)
-        # Create the follow relationship
-        UserFollows.objects.create(user=user, followed_user=user_to_follow)
+        # Each list is paginated separately; the totals are the counters
+        following, following_next = follows.get_page(
+            user.following.select_related("followed_user").only(
+                "user", "followed_user__username"
+            ),
+            self.get_cursor("following_cursor"),
+        )
+        followers, followers_next = follows.get_page(
+            user.followed_by.select_related("user").only(
+                "followed_user", "user__username"
+            ),
+            self.get_cursor("followers_cursor"),
+        )
+        return super().get_context_data(
+            following=following,
+            following_next=following_next,
+            followers=followers,
+            followers_next=followers_next,
+            **kwargs,
+        )
+
+    def form_valid(self, form):
+        # Create the follow relationship with the user read by the form
+        UserFollows.objects.create(
+            user=self.request.user, followed_user=form.followed_user
+        )
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class UserFollowBulkView(LoginRequiredMixin, FormView):
+    """
+    Follows or unfollows the users of a list of usernames at once, with one
+    write and one feed invalidation for the whole list.
+    """
+    form_class = UserFollowBulkForm
+    success_url = reverse_lazy("user-follow-bulk")
+    template_name = "reviews/user/follow_bulk_form.html"
+
+    def form_valid(self, form):
+        unfollow = form.cleaned_data["action"] == form.UNFOLLOW
+        result = follows.follow_many(
+            self.request.user, form.cleaned_data["usernames"], unfollow=unfollow
+        )
+        verb = "ne sont plus suivis" if unfollow else "sont suivis"
+        messages.success(
+            self.request,
+            f"{len(result.changed)} utilisateurs {verb}, "
+            f"{len(result.unchanged)} inchangés.",
+        )
+        if result.unknown:
+            messages.warning(
+                self.request, f"Utilisateurs inconnus : {', '.join(result.unknown)}"
+            )
         return HttpResponseRedirect(self.get_success_url())
 
 
@@ -0,0 +1,293 @@
+"""
+Named synthetic workload profiles, used by ``fake_data --profile``.
+
+A profile describes the shape of the data rather than its content: skewed
+follower counts with a few celebrity accounts, authors whose activity
+follows a power law, and bursty posting days spread over months. Every
+random draw comes from one seeded ``random.Random``, so a profile and a
+seed always produce the same data, up to the database ids, and benchmark runs
+on different commits measure the same workload. Rows are generated lazily,
+chunk by chunk, so the memory used doesn't grow with the number of posts.
+"""
+
+import math
+from bisect import bisect
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from reviews.models import Review, Ticket, UserBlocked, UserFollows
+
+# Fixed end of the generated timelines, so the dates don't depend on the
+# day the data was generated
+TIMELINE_END = datetime(2025, 1, 1, tzinfo=timezone.utc)
+# Mean delay between a ticket and the reviews answering it
+REPLY_DELAY = timedelta(days=2)
+
+
+@dataclass(frozen=True)
+class Profile:
+    name: str
+    description: str
+    users: int
+    tickets: int
+    # Mean number of reviews answering a ticket, written by other users
+    replies_per_ticket: float
+    # Share of the tickets posted together with their author's review
+    combo_ratio: float
+    # Mean number of users followed by a user
+    mean_follows: int
+    # Power-law exponents of the popularity of the followed users and of
+    # the activity of the authors. 0 is uniform.
+    follow_skew: float
+    author_skew: float
+    # The most popular accounts, followed by `celebrity_reach` of the users
+    celebrities: int
+    celebrity_reach: float
+    # Timeline length, and spread of the log-normal intensity of each day
+    months: int
+    burstiness: float
+    # Share of the users blocking 1 to 3 other users
+    block_ratio: float
+
+    @property
+    def reviews(self):
+        """Expected number of reviews."""
+        return round(self.tickets * (self.replies_per_ticket + self.combo_ratio))
+
+
+PROFILES = {
+    profile.name: profile
+    for profile in (
+        Profile(
+            name="smoke",
+            description="Tiny skewed dataset, for a quick check",
+            users=200,
+            tickets=1_000,
+            replies_per_ticket=0.6,
+            combo_ratio=0.2,
+            mean_follows=8,
+            follow_skew=1.1,
+            author_skew=0.8,
+            celebrities=3,
+            celebrity_reach=0.3,
+            months=3,
+            burstiness=0.8,
+            block_ratio=0.1,
+        ),
+        Profile(
+            name="uniform-100k",
+            description="No skew, close to the default --bulk data",
+            users=5_000,
+            tickets=60_000,
+            replies_per_ticket=0.5,
+            combo_ratio=0.15,
+            mean_follows=4,
+            follow_skew=0,
+            author_skew=0,
+            celebrities=0,
+            celebrity_reach=0,
+            months=6,
+            burstiness=0,
+            block_ratio=0.1,
+        ),
+        Profile(
+            name="social-1m",
+            description="About 1M posts, power-law follows and bursty timelines",
+            users=50_000,
+            tickets=600_000,
+            replies_per_ticket=0.5,
+            combo_ratio=0.2,
+            mean_follows=25,
+            follow_skew=1.2,
+            author_skew=1.0,
+            celebrities=20,
+            celebrity_reach=0.3,
+            months=12,
+            burstiness=0.8,
+            block_ratio=0.1,
+        ),
+        Profile(
+            name="celebrity",
+            description="A handful of accounts followed by most users",
+            users=20_000,
+            tickets=200_000,
+            replies_per_ticket=0.8,
+            combo_ratio=0.2,
+            mean_follows=15,
+            follow_skew=1.5,
+            author_skew=1.2,
+            celebrities=5,
+            celebrity_reach=0.8,
+            months=6,
+            burstiness=1.0,
+            block_ratio=0.05,
+        ),
+        Profile(
+            name="social-10m",
+            description="About 10M posts, for scale tests",
+            users=500_000,
+            tickets=6_000_000,
+            replies_per_ticket=0.5,
+            combo_ratio=0.2,
+            mean_follows=30,
+            follow_skew=1.2,
+            author_skew=1.0,
+            celebrities=50,
+            celebrity_reach=0.2,
+            months=24,
+            burstiness=0.8,
+            block_ratio=0.1,
+        ),
+    )
+}
+
+
+def power_law_index(rng, n, skew):
+    """
+    Returns an index in [0, n) drawn with a probability decreasing as
+    ``(index + 1) ** -skew``, by inverting the continuous distribution: it
+    takes constant time and memory whatever `n`.
+    """
+    u = rng.random()
+    if skew == 0:
+        return int(u * n)
+    if math.isclose(skew, 1):
+        x = (n + 1) ** u
+    else:
+        a = 1 - skew
+        x = (1 + u * ((n + 1) ** a - 1)) ** (1 / a)
+    return min(int(x) - 1, n - 1)
+
+
+def poisson(rng, mean):
+    """Knuth's Poisson sampler, fine for the small means used here."""
+    limit, k, p = math.exp(-mean), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+class Timeline:
+    """Posting dates over `months`, some days being much busier than others."""
+
+    def __init__(self, rng, months, burstiness):
+        days = max(1, months * 30)
+        self.start = TIMELINE_END - timedelta(days=days)
+        self.cum_weights = list(
+            accumulate(rng.lognormvariate(0, burstiness) for _ in range(days))
+        )
+
+    def sample(self, rng):
+        day = bisect(self.cum_weights, rng.random() * self.cum_weights[-1])
+        return self.start + timedelta(days=day, seconds=rng.random() * 86400)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Lets the instances of `models` be saved with their own time_created and
+    time_updated, instead of the current date set by auto_now(_add).
+    """
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def generate_follows(profile, rng, user_ids):
+    """
+    Yields the follows of every user of `user_ids`, which are ranked by
+    popularity: the first ones are the celebrities.
+    """
+    n = len(user_ids)
+    celebrities = min(profile.celebrities, n)
+    for index, user_id in enumerate(user_ids):
+        # Out-degrees are exponential around the mean, indegrees a power law
+        k = min(n - 1, max(1, int(rng.expovariate(1 / profile.mean_follows))))
+        followed = {
+            rank
+            for rank in range(celebrities)
+            if rng.random() < profile.celebrity_reach
+        }
+        for _ in range(k * 4):
+            if len(followed) >= k:
+                break
+            followed.add(power_law_index(rng, n, profile.follow_skew))
+        followed.discard(index)
+        for rank in sorted(followed):
+            yield UserFollows(user_id=user_id, followed_user_id=user_ids[rank])
+
+
+def generate_blocks(profile, rng, user_ids):
+    """Yields the blocks of `block_ratio` of the users, 1 to 3 each."""
+    n = len(user_ids)
+    if n < 2:
+        return
+    for index, user_id in enumerate(user_ids):
+        if rng.random() >= profile.block_ratio:
+            continue
+        blocked = {rng.randrange(n) for _ in range(rng.randint(1, 3))}
+        blocked.discard(index)
+        for rank in sorted(blocked):
+            yield UserBlocked(user_id=user_id, blocked_user_id=user_ids[rank])
+
+
+def generate_tickets(profile, rng, user_ids, texts, timeline, count):
+    """Yields `count` unsaved tickets of power-law distributed authors."""
+    for _ in range(count):
+        time_created = timeline.sample(rng)
+        author = power_law_index(rng, len(user_ids), profile.author_skew)
+        yield Ticket(
+            title=rng.choice(texts.titles),
+            description=rng.choice(texts.descriptions),
+            user_id=user_ids[author],
+            time_created=time_created,
+            time_updated=time_created,
+        )
+
+
+def make_review(rng, texts, ticket, user_id, time_created):
+    return Review(
+        ticket_id=ticket.id,
+        rating=rng.randint(0, 5),
+        headline=rng.choice(texts.headlines),
+        body=rng.choice(texts.bodies),
+        user_id=user_id,
+        time_created=time_created,
+        time_updated=time_created,
+    )
+
+
+def generate_reviews(profile, rng, user_ids, texts, tickets):
+    """
+    Yields the reviews of the saved `tickets`: the review posted with a
+    combo ticket by its author, and the replies of other users, a little
+    after the ticket. All the reviews of a ticket come from the same call,
+    so the (ticket, user) pairs only need to be unique within it.
+    """
+    n = len(user_ids)
+    for ticket in tickets:
+        reviewers = set()
+        if rng.random() < profile.combo_ratio:
+            reviewers.add(ticket.user_id)
+            yield make_review(rng, texts, ticket, ticket.user_id, ticket.time_created)
+        for _ in range(poisson(rng, profile.replies_per_ticket)):
+            user_id = user_ids[power_law_index(rng, n, profile.author_skew)]
+            if user_id == ticket.user_id or user_id in reviewers:
+                continue
+            reviewers.add(user_id)
+            delay = timedelta(seconds=rng.expovariate(1 / REPLY_DELAY.total_seconds()))
+            yield make_review(rng, texts, ticket, user_id, ticket.time_created + delay)
@@ -0,0 +1,53 @@
+// Infinite scroll of the feeds: when the "older posts" link comes near the
+// viewport, it is replaced by the cards of the next page, fetched from the
+// partial endpoint of the feed. Without JavaScript, the link still loads
+// the next page.
+(function () {
+    "use strict";
+
+    if (!("IntersectionObserver" in window) || !("fetch" in window)) {
+        return;
+    }
+
+    const observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                loadMore(entry.target);
+            }
+        });
+    }, {rootMargin: "600px 0px"});
+
+    function observeLinks(root) {
+        root.querySelectorAll("a[data-partial-url]").forEach(function (link) {
+            observer.observe(link);
+        });
+    }
+
+    function loadMore(link) {
+        observer.unobserve(link);
+        const container = link.closest("[data-feed-more]");
+        fetch(link.dataset.partialUrl, {credentials: "same-origin"})
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.text();
+            })
+            .then(function (html) {
+                const page = document.createElement("template");
+                page.innerHTML = html;
+                const links = page.content.querySelectorAll("a[data-partial-url]");
+                container.replaceWith(page.content);
+                links.forEach(function (next) {
+                    observer.observe(next);
+                });
+            })
+            .catch(function () {
+                // The link is left in place: a click loads the next page
+            });
+    }
+
+    document.addEventListener("DOMContentLoaded", function () {
+        observeLinks(document);
+    });
+})();
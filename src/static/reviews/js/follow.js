@@ -0,0 +1,57 @@
+// Username autocomplete of the follow form: the suggestions of the API are
+// shown in the datalist of the field as the user types.
+(function () {
+    "use strict";
+
+    if (!("fetch" in window)) {
+        return;
+    }
+
+    // Waits for a pause in the typing before asking for suggestions
+    const DELAY = 150;
+
+    function attach(input) {
+        const list = document.getElementById(input.getAttribute("list"));
+        let timer = null;
+        let controller = null;
+
+        function suggest() {
+            const query = input.value.trim();
+            if (controller) {
+                controller.abort();
+            }
+            if (!query) {
+                list.replaceChildren();
+                return;
+            }
+            controller = new AbortController();
+            const url = input.dataset.autocompleteUrl + "?q=" + encodeURIComponent(query);
+            fetch(url, {credentials: "same-origin", signal: controller.signal})
+                .then(function (response) {
+                    if (!response.ok) {
+                        throw new Error(response.statusText);
+                    }
+                    return response.json();
+                })
+                .then(function (data) {
+                    list.replaceChildren(...data.results.map(function (username) {
+                        const option = document.createElement("option");
+                        option.value = username;
+                        return option;
+                    }));
+                })
+                .catch(function () {
+                    // No suggestion: the field still accepts any username
+                });
+        }
+
+        input.addEventListener("input", function () {
+            clearTimeout(timer);
+            timer = setTimeout(suggest, DELAY);
+        });
+    }
+
+    document.addEventListener("DOMContentLoaded", function () {
+        document.querySelectorAll("input[data-autocomplete-url]").forEach(attach);
+    });
+})();